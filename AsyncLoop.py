@@ -0,0 +1,272 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Main loop on asyncio for the cabinets, where the input comes from a sensor board over the network and the frames go
+# out to several LED controllers. Input from the window and the joystick comes in whenever it arrives, the game steps
+# on the fixed step clock and every frame is handed to all outputs at once. Each output shows its frames on its own,
+# so a slow or stuck controller only drops frames of its own and never holds up the game or the other outputs.
+#
+# The loop measures the input to photon latency: from the moment an input arrived to the moment the first frame that
+# includes it has been shown by an output, separately for every output.
+
+import asyncio
+import concurrent.futures
+import time as systime
+
+import Joystick
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Keeps the last size latencies in a ring buffer, like Profiler.FrameProfiler does for the frame times.
+class LatencyStats:
+
+    def __init__(self, size=1000):
+        self.size = size
+        self.samples = [0.0] * size
+        self.count = 0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        self.samples[self.count % self.size] = seconds
+        self.count += 1
+        self.worst = max(self.worst, seconds)
+
+    # min, avg and p99 in seconds over the ring buffer
+    def stats(self):
+        count = min(self.count, self.size)
+        if not count:
+            return 0.0, 0.0, 0.0
+        samples = sorted(self.samples[:count])
+        return samples[0], sum(samples) / count, samples[min(count - 1, (count * 99) // 100)]
+
+    def summary(self):
+        if not self.count:
+            return "no input"
+        return "{:.1f}/{:.1f}/{:.1f}ms max {:.1f}ms".format(*(s * 1000 for s in self.stats() + (self.worst,)))
+
+
+# One output of the loop. offer copies the newest frame into a buffer of the output, run shows the frames on a thread
+# of its own. A frame that gets replaced before it was shown counts as dropped, its input still gets measured with the
+# frame that replaced it. Sinks that have to stay on the main thread, like the pygame window, are shown from the loop
+# itself with inline.
+class Output:
+
+    def __init__(self, sink, name, inline=False):
+        if np is None:
+            raise ImportError("Output requires numpy.")
+        self.sink = sink
+        self.name = name
+        self.inline = inline
+        self.pending = None
+        self.showing = None
+        self.waiting = False
+        self.closed = False
+        self.fresh = asyncio.Event()
+        # Set while the output has shown everything it was offered.
+        self.idle = asyncio.Event()
+        self.idle.set()
+        # Simulation time of the frame being shown, a FrameRecorder going along with the output uses it as its clock.
+        self.frame_time = 0
+        self.pending_time = 0
+        # When the oldest input in the pending frame arrived, None if there is none.
+        self.input = None
+        self.status = ""
+        self.frames = 0
+        self.dropped = 0
+        self.latency = LatencyStats()
+
+    def offer(self, frame, time, arrival, status=""):
+        if self.pending is None:
+            self.pending = np.empty_like(frame)
+            self.showing = np.empty_like(frame)
+        if self.waiting:
+            self.dropped += 1
+            if self.input is not None:
+                arrival = self.input if arrival is None else min(arrival, self.input)
+        np.copyto(self.pending, frame)
+        self.pending_time = time
+        self.input = arrival
+        self.status = status
+        self.waiting = True
+        self.idle.clear()
+        self.fresh.set()
+
+    # Shows the frames that get offered until close, the last one still goes out.
+    async def run(self):
+        executor = None if self.inline else concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix=self.name)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                await self.fresh.wait()
+                self.fresh.clear()
+                if not self.waiting:
+                    if self.closed:
+                        break
+                    continue
+                self.pending, self.showing = self.showing, self.pending
+                self.frame_time = self.pending_time
+                arrival = self.input
+                self.input = None
+                self.waiting = False
+                if executor is None:
+                    self.show(self.showing)
+                else:
+                    await loop.run_in_executor(executor, self.show, self.showing)
+                self.frames += 1
+                if arrival is not None:
+                    self.latency.add(systime.perf_counter() - arrival)
+                if not self.waiting:
+                    self.idle.set()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def show(self, frame):
+        self.sink.set_status(self.status)
+        self.sink.show(frame)
+
+    def close(self):
+        self.closed = True
+        self.fresh.set()
+
+    def stats(self):
+        stats = {"output": self.name, "frames": self.frames, "dropped": self.dropped,
+                 "latency": self.latency.summary()}
+        if hasattr(self.sink, "stats"):
+            stats.update(self.sink.stats())
+        return stats
+
+
+# Steps the game like the other main loops in twang.py, in real time or as fast as possible, with the input going
+# through source. Live input from the window and the joystick goes into queued, an Input.QueuedInput that source reads
+# from, put also notes when it arrived for the latency.
+class AsyncLoop:
+
+    def __init__(self, game, outputs, source, clock, profiler, queued=None, window=None):
+        self.game = game
+        self.outputs = outputs
+        self.source = source
+        self.clock = clock
+        self.profiler = profiler
+        self.queued = queued
+        self.window = window
+        # A Joystick per board, by address.
+        self.joysticks = {}
+        self.arrivals = []
+        # Arrival of the oldest input that went into the game since the last frame.
+        self.input = None
+        self.elapsed = 0.0
+
+    def put(self, action, arrival=None):
+        self.queued.put(action)
+        self.arrivals.append(systime.perf_counter() if arrival is None else arrival)
+
+    def joystick_sample(self, line, board=None):
+        arrival = systime.perf_counter()
+        joystick = self.joysticks.get(board)
+        if joystick is None:
+            joystick = self.joysticks[board] = Joystick.Joystick()
+        for action in joystick.parse(line):
+            self.put(action, arrival)
+
+    def joystick_closed(self, board):
+        joystick = self.joysticks.pop(board, None)
+        if joystick is not None:
+            for action in joystick.release():
+                self.put(action)
+
+    async def run(self, steps, realtime, joystick=None):
+        game = self.game
+        clock = self.clock
+        profiler = self.profiler
+        render_interval = clock.render_interval()
+        tasks = [asyncio.create_task(output.run()) for output in self.outputs]
+        listener = None
+        if joystick is not None:
+            listener = await Joystick.listen(joystick, self.joystick_sample, self.joystick_closed)
+        starttime = systime.perf_counter()
+        time = 0
+        summary = ""
+        summary_time = 0
+        running = True
+        try:
+            while running and clock.steps < steps:
+                profiler.begin()
+                if self.window is not None:
+                    for action in self.window.poll(None):
+                        self.put(action)
+                for _ in range(clock.due() if realtime else 1):
+                    actions = self.source.poll(clock.steps)
+                    # Polling hands everything that was queued to the game.
+                    if self.arrivals:
+                        oldest = self.arrivals[0]
+                        self.input = oldest if self.input is None else min(self.input, oldest)
+                        self.arrivals.clear()
+                    for action in actions:
+                        if action == "quit":
+                            running = False
+                        game.handle(action, clock.time)
+                    profiler.lap("input")
+                    if not running:
+                        break
+                    time = clock.advance()
+                    game.update(time)
+                    profiler.lap("tick")
+                    game.collide()
+                    profiler.lap("collide")
+                if running and (clock.render_due() if realtime else (clock.steps - 1) % render_interval == 0):
+                    game.draw(time)
+                    profiler.lap("draw")
+                    frame = game.ledstring.frame()
+                    # The latency summary is only refreshed twice a second, like the profiler summary in run_pygame.
+                    if time - summary_time >= 500:
+                        summary = self.latency()
+                        summary_time = time
+                    status = "t: {} s: {} {}".format(clock.time // 1000, game.player_speed, summary)
+                    # Runs that are not in real time wait for the outputs instead of dropping frames, like the block
+                    # policy of the threaded loop, so they show and record every frame.
+                    if not realtime:
+                        for output in self.outputs:
+                            await output.idle.wait()
+                    for output in self.outputs:
+                        output.offer(frame, time, self.input, status)
+                    self.input = None
+                profiler.end()
+                # Gives the outputs and the joystick a chance to run, in real time until the next step is due.
+                await asyncio.sleep(clock.delay() if realtime else 0)
+        finally:
+            if listener is not None:
+                listener.close()
+            for output in self.outputs:
+                output.close()
+            await asyncio.gather(*tasks)
+            self.elapsed = systime.perf_counter() - starttime
+
+    # Latency of the first output for the status bar
+    def latency(self):
+        if not self.outputs:
+            return ""
+        return "latency " + self.outputs[0].latency.summary()
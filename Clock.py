@@ -0,0 +1,97 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time as systime
+
+
+# Fixed timestep simulation clock. The game always advances in steps of exactly 1/rate seconds, each step getting the
+# simulation time in integer milliseconds, so the gameplay does not depend on how fast frames are rendered. When running
+# in real time the main loop asks how many steps are due and runs all of them before rendering, so a slow frame is
+# caught up instead of slowing the game down. Only when we fall more than max_catchup steps behind the missing steps
+# are skipped, otherwise we would never get back on track. Headless loops just call advance as fast as they can.
+class FixedStepClock:
+
+    def __init__(self, rate=60, render_rate=None, max_catchup=10, source=systime.perf_counter):
+        self.rate = rate
+        self.render_rate = render_rate if render_rate else rate
+        self.max_catchup = max_catchup
+        self.source = source
+        self.steps = 0
+        self.skipped = 0
+        self.start = None
+        self.next_render = None
+
+    # Simulation time of the next step in milliseconds.
+    @property
+    def time(self):
+        return self.steps * 1000 // self.rate
+
+    # Simulation time of the last step that was simulated, the one a frame drawn now shows.
+    @property
+    def frame_time(self):
+        return max(self.steps - 1, 0) * 1000 // self.rate
+
+    # Time of the step to simulate now, moving the clock on to the next one.
+    def advance(self):
+        time = self.time
+        self.steps += 1
+        return time
+
+    # Number of steps that need to be simulated to catch up with the real time.
+    def due(self):
+        now = self.source()
+        if self.start is None:
+            self.start = now
+            self.next_render = now
+        due = int((now - self.start) * self.rate) + 1 - self.steps
+        if due > self.max_catchup:
+            self.skipped += due - self.max_catchup
+            self.start += (due - self.max_catchup) / self.rate
+            due = self.max_catchup
+        return max(due, 0)
+
+    # True when it is time to render another frame at the render rate.
+    def render_due(self):
+        now = self.source()
+        if self.next_render is None or now >= self.next_render:
+            self.next_render = (self.next_render or now) + 1 / self.render_rate
+            if self.next_render < now:
+                self.next_render = now + 1 / self.render_rate
+            return True
+        return False
+
+    # Seconds until the next simulation step or frame is due, for loops that wait in their own way.
+    def delay(self):
+        if self.start is None:
+            return 0.0
+        wakeup = min(self.start + self.steps / self.rate, self.next_render)
+        return max(wakeup - self.source(), 0.0)
+
+    # Sleep until the next simulation step or frame is due.
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            systime.sleep(delay)
+
+    # Every how many simulation steps a frame gets rendered when not running in real time.
+    def render_interval(self):
+        return max(1, round(self.rate / self.render_rate))
@@ -21,11 +21,23 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import utils
-import math
+import lib8tion
+import SpatialIndex
+import numpy as np
+
+
+# Enemies wobble like sin(time / 3000 * speed) in radians, this turns time * speed into a 16 bit angle for sin16 as
+# 16.16 fixed point: 65536 / (2 pi 3000) * 65536.
+WOBBLE_SCALE = 227855
+
+RED = (255, 0, 0)
+_red = np.array(RED, dtype=np.uint8)
 
 
 class Enemy:
 
+    __slots__ = ("ledstring", "world", "position", "origin", "speed", "wobble", "alive", "player_side")
+
     def __init__(self, ledstring, world, position=0, speed=0, wobble=0):
         self.ledstring = ledstring
         self.world = world
@@ -43,13 +55,14 @@ class Enemy:
     def draw(self):
         if self.alive:
             draw_pos = utils.range_constrain(self.position, 0, len(self.ledstring) - 1)
-            self.ledstring[draw_pos].rgb((255, 0, 0))
+            self.ledstring[draw_pos] = RED
 
     def tick(self, time):
         if not self.alive:
             return
         if self.wobble:
-            self.position = self.origin + int(math.sin((time / 3000.0) * self.speed) * self.wobble)
+            theta = (time * self.speed * WOBBLE_SCALE) >> 16
+            self.position = self.origin + ((lib8tion.sin16(theta) * self.wobble) >> 15)
         else:
             self.position += self.speed
             if self.position >= len(self.ledstring) or self.position < 0:
@@ -65,6 +78,9 @@ class Enemy:
             e_pos = self.position
             if e_pos > (p_pos - (p_range // 2)) and e_pos < (p_pos + (p_range // 2)):
                 self.alive = False
+                particles = self.world.get("particles")
+                if particles is not None:
+                    particles.burst(e_pos, 40, (255, 64, 0))
 
     def spawn(self, position, speed, wobble=0):
         self.alive = True
@@ -76,3 +92,197 @@ class Enemy:
             self.player_side = 1
         else:
             self.player_side = -1
+
+
+# All enemies of a world in one struct of arrays. Instead of one Enemy object per enemy that lives on forever, every
+# enemy is a slot in the arrays below. Dead slots go onto a free list and are reused by the next spawn, so the pool only
+# grows up to the most enemies alive at the same time. Tick works on all live enemies at once. For the attack and the
+# player contact tests the live enemies are kept in two spatial indices, one for the enemies that came from the right
+# of the player and one for the ones from the left, which turns those tests into binary searches. The pool registers
+# itself as world["enemy_pool"] and its indices as "enemies_right" and "enemies_left".
+class EnemyPool:
+
+    def __init__(self, ledstring, world, capacity=64):
+        self.ledstring = ledstring
+        self.world = world
+        self.position = np.zeros(capacity, dtype=np.int64)
+        self.origin = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity, dtype=np.int64)
+        self.wobble = np.zeros(capacity, dtype=np.int64)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.player_side = np.zeros(capacity, dtype=np.int8)
+        # Slots below used have been handed out at some point, the ones of those that are dead are in free.
+        self.used = 0
+        self.free = []
+        self.sides = {
+            1: SpatialIndex.index_for(world, "enemies_right"),
+            -1: SpatialIndex.index_for(world, "enemies_left"),
+        }
+        self.index_dirty = False
+        self.__scratch()
+        world["enemy_pool"] = self
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive[:self.used]))
+
+    def __grow(self):
+        capacity = len(self.alive) * 2
+        for name in ("position", "origin", "speed", "wobble", "alive", "player_side"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+        self.__scratch()
+
+    # Scratch arrays for tick and draw, all the math happens in place in these over the whole capacity, dead and unused
+    # slots are masked out. That way a step does not create any temporary arrays.
+    def __scratch(self):
+        capacity = len(self.alive)
+        self.wobbling = np.zeros(capacity, dtype=bool)
+        self.moving = np.zeros(capacity, dtype=bool)
+        self.mask = np.zeros(capacity, dtype=bool)
+        self.live = np.zeros(capacity, dtype=bool)
+        self.scratch = np.zeros(capacity, dtype=np.int64)
+        self.carry = np.zeros(capacity, dtype=np.int64)
+        self.angle = np.zeros(capacity, dtype=np.int32)
+        self.pixels = np.zeros((capacity, 3), dtype=np.intp)
+        self.channels = (self.pixels[:, 0], self.pixels[:, 1], self.pixels[:, 2])
+
+    def spawn(self, position, speed, wobble=0):
+        if self.free:
+            slot = self.free.pop()
+        else:
+            if self.used == len(self.alive):
+                self.__grow()
+            slot = self.used
+            self.used += 1
+        self.alive[slot] = True
+        self.position[slot] = position
+        self.origin[slot] = position
+        self.speed[slot] = speed
+        self.wobble[slot] = wobble
+        self.player_side[slot] = 1 if position > self.world["player"].position else -1
+        self.index_dirty = True
+        return slot
+
+    # Removes all enemies, handing out the slots from the start again.
+    def clear(self):
+        self.alive[:] = False
+        self.used = 0
+        self.free = []
+        # The slots are handed out anew, the indices would still hold the old ones.
+        for index in self.sides.values():
+            index.clear()
+        self.index_dirty = True
+
+    def kill(self, slots):
+        self.alive[slots] = False
+        self.free.extend(slots.tolist())
+        self.index_dirty = True
+
+    def update_index(self):
+        if not self.index_dirty:
+            return
+        used = self.used
+        live = self.live[:used]
+        for side, index in self.sides.items():
+            np.equal(self.player_side[:used], side, out=live)
+            np.logical_and(live, self.alive[:used], out=live)
+            index.update(self.position[:used], live)
+        self.index_dirty = False
+
+    def draw(self):
+        alive = self.alive
+        if not np.count_nonzero(alive):
+            return
+        led = self.scratch
+        np.clip(self.position, 0, len(self.ledstring) - 1, out=led)
+        if not hasattr(self.ledstring, "buffer"):
+            for position in led[alive].tolist():
+                self.ledstring[position] = RED
+            return
+        # Dead slots are drawn over the first live enemy, which is red already. Then every slot becomes the offsets of
+        # its three bytes in the framebuffer, put repeats the three channel values over all of them.
+        np.logical_not(alive, out=self.mask)
+        np.copyto(led, led[alive.argmax()], where=self.mask)
+        r, g, b = self.channels
+        np.multiply(led, 3, out=r)
+        np.add(r, 1, out=g)
+        np.add(r, 2, out=b)
+        self.ledstring.buffer.reshape(-1).put(self.pixels, _red)
+
+    def tick(self, time):
+        alive = self.alive
+        wobble = self.wobble
+        position = self.position
+        speed = self.speed
+        wobbling = self.wobbling
+        moving = self.moving
+        scratch = self.scratch
+
+        np.not_equal(wobble, 0, out=wobbling)
+        np.logical_and(wobbling, alive, out=wobbling)
+        # Alive and not wobbling
+        np.greater(alive, wobbling, out=moving)
+
+        if np.count_nonzero(wobbling):
+            np.multiply(speed, time * WOBBLE_SCALE, out=scratch)
+            np.right_shift(scratch, 16, out=scratch)
+            lib8tion.sin16(scratch, out=self.angle)
+            # Mixed types would make numpy convert through a temporary
+            np.copyto(scratch, self.angle)
+            np.multiply(scratch, wobble, out=scratch)
+            np.right_shift(scratch, 15, out=scratch)
+            np.add(scratch, self.origin, out=scratch)
+            np.copyto(position, scratch, where=wobbling)
+            self.index_dirty = True
+
+        if not np.count_nonzero(moving):
+            return
+        self.index_dirty = True
+        np.add(position, speed, out=position, where=moving)
+        hazards = self.world.get("hazards")
+        if hazards is not None and len(hazards.conveyor_leds):
+            # Conveyors carry the enemies that are not wobbling around a fixed point. The position before moving is
+            # always on the string, anything the speed took off it gets killed below anyway.
+            np.subtract(position, speed, out=scratch)
+            hazards.conveyor.take(scratch, out=self.carry, mode="clip")
+            np.add(position, self.carry, out=position, where=moving)
+
+        outside = self.mask
+        np.less(position, 0, out=outside)
+        np.greater_equal(position, len(self.ledstring), out=wobbling)
+        np.logical_or(outside, wobbling, out=outside)
+        np.logical_and(outside, moving, out=outside)
+        if np.count_nonzero(outside):
+            self.kill(np.flatnonzero(outside))
+
+    def collide(self):
+        player = self.world["player"]
+        if not player.attacking:
+            return
+        self.update_index()
+        reach = player.attack_width // 2
+        for index in self.sides.values():
+            hit = index.between(player.position - reach, player.position + reach)
+            if len(hit):
+                self.kill(hit)
+                particles = self.world.get("particles")
+                if particles is not None:
+                    for position in self.position[hit].tolist():
+                        particles.burst(position, 40, (255, 64, 0))
+
+    # True if any live enemy touches or got past the player at the given position. That is the case when an enemy
+    # that came from the right is at or left of the player, or one from the left is at or right of the player.
+    def player_contact(self, position):
+        self.update_index()
+        return self.sides[1].below(position) is not None or self.sides[-1].above(position) is not None
+
+    # Slots of the closest live enemy at or left of the position and at or right of it, None where there is none.
+    def nearest(self, position):
+        self.update_index()
+        left = [slot for slot in (index.below(position) for index in self.sides.values()) if slot is not None]
+        right = [slot for slot in (index.above(position) for index in self.sides.values()) if slot is not None]
+        left = max(left, key=lambda slot: self.position[slot]) if left else None
+        right = min(right, key=lambda slot: self.position[slot]) if right else None
+        return left, right
@@ -0,0 +1,134 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Frame sinks are the places finished LED frames get pushed to. The game and the screensavers only ever draw into an
+# LEDString, the main loop then hands ledstring.frame() to one or more sinks. None of this needs pygame, so the whole
+# simulation can run without a display, for example on build machines or for benchmarking.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class FrameSink:
+
+    # Prepare the output, open windows, connections and the like.
+    def open(self):
+        pass
+
+    # Output one frame. The frame is only valid during the call, sinks that want to keep it have to copy it.
+    def show(self, frame):
+        pass
+
+    # Text describing the current state of the game, sinks that have a way to show it can do so.
+    def set_status(self, text):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Throws all frames away, useful to measure the raw simulation speed.
+class NullSink(FrameSink):
+
+    def __init__(self):
+        self.frames = 0
+
+    def show(self, frame):
+        self.frames += 1
+
+
+# Keeps copies of the frames in memory, the most recent limit frames if a limit is given.
+class MemorySink(FrameSink):
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.frames = []
+        self.status = ""
+
+    def show(self, frame):
+        if np is not None:
+            self.frames.append(np.array(frame, dtype=np.uint8))
+        else:
+            self.frames.append([tuple(color) for color in frame])
+        if self.limit is not None and len(self.frames) > self.limit:
+            del self.frames[0]
+
+    def set_status(self, text):
+        self.status = text
+
+
+# Hands every frame to several sinks, for example the window and a recorder. The simulator splits showing a frame into
+# render and present, those are passed on to the sinks that have them.
+class TeeSink(FrameSink):
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def open(self):
+        for sink in self.sinks:
+            sink.open()
+
+    def show(self, frame):
+        for sink in self.sinks:
+            sink.show(frame)
+
+    def set_status(self, text):
+        for sink in self.sinks:
+            sink.set_status(text)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def render(self, frame):
+        for sink in self.sinks:
+            if hasattr(sink, "render"):
+                sink.render(frame)
+            else:
+                sink.show(frame)
+
+    def present(self):
+        for sink in self.sinks:
+            if hasattr(sink, "present"):
+                sink.present()
+
+    def invalidate(self):
+        for sink in self.sinks:
+            if hasattr(sink, "invalidate"):
+                sink.invalidate()
+
+    def stats(self):
+        stats = {}
+        for i, sink in enumerate(self.sinks):
+            if hasattr(sink, "stats"):
+                for name, value in sink.stats().items():
+                    stats[name if len(self.sinks) == 1 else "{}{}".format(name, i)] = value
+        return stats
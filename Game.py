@@ -0,0 +1,122 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import hashlib
+import Screensaver
+import Player
+import Enemy
+import Particle
+import Level
+import Hazard
+
+
+# Everything that makes up one running game on an LED string. It does not know anything about windows, input devices or
+# outputs, the main loop feeds it the input and hands the LED string it draws into to the frame sinks.
+class Game:
+
+    def __init__(self, ledstring, screensaver=False, seed=None, levels=None, level=0):
+        self.ledstring = ledstring
+        self.world = {}
+        self.player = Player.Player(ledstring, self.world)
+        self.enemies = Enemy.EnemyPool(ledstring, self.world)
+        self.particles = Particle.ParticlePool(ledstring, self.world, seed=seed)
+        self.hazards = Hazard.Hazards(ledstring, self.world)
+        self.screensaver = Screensaver.Screensaver(ledstring, seed) if screensaver else None
+        self.player_speed = 0
+        if levels is None:
+            levels = Level.load_levels(len(ledstring))
+        self.level = Level.LevelEngine(self, levels, level)
+
+    # Applies one input action, see Input.py for where they come from. Holding left or right moves the player, up or
+    # down attacks. player_speed counts the held directions of all inputs, so the keyboard and the joystick or two
+    # joysticks can hold the same one, the player still only moves one LED per step.
+    def handle(self, action, time):
+        if action == "left_press":
+            self.player_speed -= 1
+        elif action == "left_release":
+            self.player_speed += 1
+        elif action == "right_press":
+            self.player_speed += 1
+        elif action == "right_release":
+            self.player_speed -= 1
+        elif action == "attack":
+            self.player.attack(time)
+
+    def tick(self, time):
+        self.update(time)
+        self.collide()
+        self.draw(time)
+
+    # The three stages of a game step, split up so that the main loop can time them separately.
+    def update(self, time):
+        if self.screensaver:
+            self.screensaver.tick(time)
+            return
+
+        self.player.speed = max(-1, min(self.player_speed, 1))
+        self.hazards.tick(time)
+        self.player.tick(time)
+        self.level.tick(time)
+        self.enemies.tick(time)
+        self.particles.tick(time)
+
+    def collide(self):
+        if self.screensaver:
+            return
+
+        self.enemies.collide()
+        self.player.collide()
+
+    def draw(self, time):
+        if self.screensaver:
+            return
+
+        self.ledstring.clear()
+        self.hazards.draw(time)
+        self.player.draw(time)
+        self.enemies.draw()
+        self.particles.draw()
+
+    # Everything that decides how the game continues, as plain values. Two runs are in the same state when these compare
+    # equal, replays use that to check they ended up where the recording did.
+    def state(self):
+        player = self.player
+        enemies = self.enemies
+        slots = enemies.alive[:enemies.used].nonzero()[0].tolist()
+        state = {
+            "player": (player.position, player.speed, player.attacking, player.attack_millis),
+            "player_speed": self.player_speed,
+            "enemies": [(slot, int(enemies.position[slot]), int(enemies.origin[slot]), int(enemies.speed[slot]),
+                         int(enemies.wobble[slot]), int(enemies.player_side[slot])) for slot in slots],
+            "free": list(enemies.free),
+            "level": self.level.state(),
+            "lava": (self.hazards.start_time, sorted(self.hazards.queue)),
+            "particles": (self.particles.position.tolist(), self.particles.velocity.tolist(),
+                          self.particles.life.tolist()),
+        }
+        if self.screensaver:
+            state["screensaver"] = self.screensaver.random.seed
+        return state
+
+    # Short fingerprint of state() for printing.
+    def digest(self):
+        return hashlib.sha1(repr(self.state()).encode()).hexdigest()[:16]
@@ -0,0 +1,118 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Lava and conveyors of the current level. Everything is kept in arrays with one entry per LED: whether the LED is lava
+# that is hot right now and how far a conveyor moves things on it. Anything moving around only has to look up its own
+# position, no matter how many lava stretches and conveyors there are, and drawing is a couple of whole array
+# operations.
+#
+# Lava switches on and off on timers, which are kept in a heap like the spawners of Level.py, so a step only does work
+# when some lava actually switches.
+
+import heapq
+
+import numpy as np
+import Palette
+
+# Hot lava shimmers between orange and a deeper red, moving along the string over time.
+LAVA_HOT = Palette.Palette.from_gradient([(0, (255, 64, 0)), (128, (255, 16, 0)), (255, (255, 64, 0))])
+LAVA_COOL = np.array((3, 0, 0), dtype=np.uint8)
+
+
+class Hazards:
+
+    def __init__(self, ledstring, world):
+        self.ledstring = ledstring
+        self.world = world
+        length = len(ledstring)
+        self.lava = []
+        self.lava_zone = np.zeros(length, dtype=bool)
+        self.lava_hot = np.zeros(length, dtype=bool)
+        self.conveyor = np.zeros(length, dtype=np.int64)
+        self.queue = []
+        self.start_time = 0
+        self.__compile_drawing()
+        # Scratch space for drawing
+        self.mask = np.zeros(length, dtype=bool)
+        world["hazards"] = self
+
+    # Switches to the lava and conveyors of a compiled level.
+    def load(self, level, time):
+        self.lava = level.lava
+        self.lava_zone = level.lava_zone
+        self.conveyor = level.conveyor
+        self.lava_hot[:] = False
+        self.start_time = time
+        # Entries are (due, lava, hot), all lava starts out cool and heats up after its offset.
+        self.queue = [(offset, i, True) for i, (_, _, on, _, offset) in enumerate(self.lava) if on > 0]
+        heapq.heapify(self.queue)
+        self.__compile_drawing()
+        self.tick(time)
+
+    def __compile_drawing(self):
+        self.conveyor_leds = np.flatnonzero(self.conveyor)
+        self.conveyor_direction = np.sign(self.conveyor[self.conveyor_leds])
+
+    def tick(self, time):
+        elapsed = time - self.start_time
+        queue = self.queue
+        while queue and queue[0][0] <= elapsed:
+            due, i, hot = queue[0]
+            left, right, on, off, _ = self.lava[i]
+            self.lava_hot[left:right + 1] = hot
+            heapq.heapreplace(queue, (due + (on if hot else off), i, not hot))
+
+    def hot(self, position):
+        return self.lava_hot[position]
+
+    # Where something at position ends up after moving by amount, with the conveyor under it and limited to the string.
+    def move(self, position, amount):
+        position += amount + int(self.conveyor[position])
+        return min(max(position, 0), len(self.ledstring) - 1)
+
+    # Hot lava is bright orange shimmering red, cool lava a dim red glow. Conveyors are dim blue with brighter stripes
+    # moving in their direction like the Arduino version.
+    def draw(self, time):
+        if not hasattr(self.ledstring, "buffer"):
+            self.__draw_list(time)
+            return
+        buffer = self.ledstring.buffer
+        if len(self.lava):
+            np.greater(self.lava_zone, self.lava_hot, out=self.mask)
+            np.copyto(buffer, LAVA_COOL, where=self.mask[:, None])
+            hot = np.flatnonzero(self.lava_hot)
+            buffer[hot] = Palette.color_from_palette(LAVA_HOT, hot * 16 + time // 8)
+        if len(self.conveyor_leds):
+            leds = self.conveyor_leds
+            phase = (leds * self.conveyor_direction - time // 100) % 5
+            buffer[leds, 2] = np.where(phase == 0, 40, 5)
+
+    def __draw_list(self, time):
+        if len(self.lava):
+            leds = np.flatnonzero(self.lava_zone)
+            colors = np.where(self.lava_hot[leds, None], Palette.color_from_palette(LAVA_HOT, leds * 16 + time // 8),
+                              LAVA_COOL)
+            for position, color in zip(leds.tolist(), colors.tolist()):
+                self.ledstring[position].rgb(tuple(color))
+        for position, direction in zip(self.conveyor_leds.tolist(), self.conveyor_direction.tolist()):
+            led = self.ledstring[position]
+            led.rgb((led.r, led.g, 40 if (position * direction - time // 100) % 5 == 0 else 5))
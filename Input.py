@@ -0,0 +1,163 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Input for the game comes from event sources as a list of actions per simulation step. The actions are the ones
+# Game.handle understands, plus "quit". Because the game only ever sees actions tagged with the step they happened in,
+# a session can be recorded into a file and replayed later, getting the game into exactly the same state, no matter how
+# fast or slow the replay runs.
+
+import queue
+
+ACTIONS = ("left_press", "left_release", "right_press", "right_release", "attack", "quit")
+INPUT_FORMAT = "twang-input 1"
+
+
+# No input at all, for the screensavers and plain benchmark runs.
+class InputSource:
+
+    # Actions that happened before the given simulation step gets run.
+    def poll(self, step):
+        return []
+
+    # True once the source will not produce any more actions.
+    def done(self, step):
+        return False
+
+    def close(self):
+        pass
+
+
+# Arrow keys and q from the pygame window. Window events that are not game input are passed on to the sink. With a
+# replay source the keyboard is ignored and the game is played from that, closing the window still quits.
+class PygameInput(InputSource):
+
+    def __init__(self, sink, replay=None):
+        import pygame
+        self.pygame = pygame
+        self.sink = sink
+        self.replay = replay
+        self.keys = {
+            pygame.K_LEFT: ("left_press", "left_release"),
+            pygame.K_RIGHT: ("right_press", "right_release"),
+            pygame.K_UP: ("attack", None),
+            pygame.K_DOWN: ("attack", None),
+            pygame.K_q: ("quit", None),
+        }
+
+    def poll(self, step):
+        pygame = self.pygame
+        actions = []
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                actions.append("quit")
+            elif event.type == pygame.WINDOWEXPOSED:
+                # The window contents got lost, repaint everything.
+                self.sink.invalidate()
+            elif self.replay is None and (event.type == pygame.KEYDOWN or event.type == pygame.KEYUP):
+                press, release = self.keys.get(event.key, (None, None))
+                action = press if event.type == pygame.KEYDOWN else release
+                if action is not None:
+                    actions.append(action)
+        if self.replay is not None:
+            actions.extend(self.replay.poll(step))
+        return actions
+
+
+# Actions coming in from another thread, like the window events when the simulation runs on a thread of its own. The
+# other thread puts them in whenever it gets them, they go to the game at the next poll. With a replay source the
+# recorded actions are added at the steps they were recorded at.
+class QueuedInput(InputSource):
+
+    def __init__(self, replay=None):
+        self.queue = queue.SimpleQueue()
+        self.replay = replay
+
+    def put(self, action):
+        self.queue.put(action)
+
+    def poll(self, step):
+        actions = []
+        while not self.queue.empty():
+            actions.append(self.queue.get())
+        if self.replay is not None:
+            actions.extend(self.replay.poll(step))
+        return actions
+
+    def done(self, step):
+        return self.replay is not None and self.replay.done(step)
+
+    def close(self):
+        if self.replay is not None:
+            self.replay.close()
+
+
+# Passes the actions of another source through and writes them to a file, one "step action" line each.
+class InputRecorder(InputSource):
+
+    def __init__(self, source, path, rate):
+        self.source = source
+        self.file = open(path, "w")
+        self.file.write("{} {}\n".format(INPUT_FORMAT, rate))
+
+    def poll(self, step):
+        actions = self.source.poll(step)
+        for action in actions:
+            self.file.write("{} {}\n".format(step, action))
+        return actions
+
+    def done(self, step):
+        return self.source.done(step)
+
+    def close(self):
+        self.file.close()
+        self.source.close()
+
+
+# Plays back a file written by InputRecorder. The recording is only valid at the step rate it was made with.
+class ReplayInput(InputSource):
+
+    def __init__(self, path):
+        with open(path) as file:
+            header = file.readline().split()
+            if " ".join(header[:2]) != INPUT_FORMAT:
+                raise ValueError("{} is not an input recording".format(path))
+            self.rate = int(header[2])
+            self.events = []
+            for number, line in enumerate(file, 2):
+                step, action = line.split()
+                if action not in ACTIONS:
+                    raise ValueError("{}:{}: unknown action {}".format(path, number, action))
+                self.events.append((int(step), action))
+        self.next = 0
+
+    def poll(self, step):
+        start = self.next
+        while self.next < len(self.events) and self.events[self.next][0] <= step:
+            self.next += 1
+        return [action for _, action in self.events[start:self.next]]
+
+    def done(self, step):
+        return self.next >= len(self.events)
+
+    # The step the last action happens at, 0 for an empty recording.
+    def length(self):
+        return self.events[-1][0] if self.events else 0
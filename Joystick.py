@@ -0,0 +1,180 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# The original TWANG is played with a door stop spring on an accelerometer. Tilting the spring moves the player and
+# flicking it so it wobbles attacks. Here the sensor board sends its readings over the network, one sample per line
+# (TCP) or datagram (UDP) as two numbers: the tilt in degrees, positive towards the end of the string, and the wobble,
+# the raw acceleration magnitude the Arduino code compares against its attack threshold.
+#
+#   12.5 2300
+#
+# Joystick turns the samples into the same actions as the keyboard, so the game, recordings and replays do not need to
+# know where the input came from. Every board gets a Joystick of its own, two boards holding the same direction press it
+# twice and the game clamps the player speed. There is only one speed, any tilt past the dead zone moves at it.
+#
+# Running this file is a stand in for the sensor board, it sends a spring being tilted back and forth and flicked every
+# now and then to the given address.
+#
+#   python Joystick.py udp:127.0.0.1:7777
+
+import asyncio
+import math
+import socket
+import time as systime
+
+# Same values as the Arduino version
+DEADZONE = 5
+ATTACK_THRESHOLD = 30000
+
+
+class Joystick:
+
+    def __init__(self, deadzone=DEADZONE, attack_threshold=ATTACK_THRESHOLD):
+        self.deadzone = deadzone
+        self.attack_threshold = attack_threshold
+        # Direction the joystick is held in, -1, 0 or 1, and if the last sample was wobbling.
+        self.side = 0
+        self.wobbling = False
+        self.samples = 0
+        self.invalid = 0
+
+    # Returns the actions a sample leads to. Holding the tilt only presses once, an attack needs the wobble to drop back
+    # below the threshold before it can go off again.
+    def sample(self, tilt, wobble):
+        self.samples += 1
+        actions = []
+        side = 0 if abs(tilt) <= self.deadzone else (1 if tilt > 0 else -1)
+        if side != self.side:
+            if self.side:
+                actions.append("right_release" if self.side > 0 else "left_release")
+            if side:
+                actions.append("right_press" if side > 0 else "left_press")
+            self.side = side
+        wobbling = wobble > self.attack_threshold
+        if wobbling and not self.wobbling:
+            actions.append("attack")
+        self.wobbling = wobbling
+        return actions
+
+    # Releases whatever is held, for a board that went away in the middle of a tilt.
+    def release(self):
+        actions = []
+        if self.side:
+            actions.append("right_release" if self.side > 0 else "left_release")
+            self.side = 0
+        self.wobbling = False
+        return actions
+
+    # Same for the raw text of a sample, lines that do not parse are counted and ignored.
+    def parse(self, line):
+        try:
+            tilt, wobble = (float(value) for value in line.split())
+        except ValueError:
+            self.invalid += 1
+            return []
+        return self.sample(tilt, wobble)
+
+
+# Splits udp:host:port or tcp:host:port.
+def parse_address(address):
+    protocol, _, rest = address.partition(":")
+    host, _, port = rest.rpartition(":")
+    if protocol not in ("udp", "tcp") or not host or not port.isdigit():
+        raise ValueError("joystick address has to look like udp:host:port or tcp:host:port, not {}".format(address))
+    return protocol, host, int(port)
+
+
+class _Datagrams(asyncio.DatagramProtocol):
+
+    def __init__(self, received):
+        self.received = received
+
+    def datagram_received(self, data, address):
+        for line in data.decode("ascii", "replace").splitlines():
+            self.received(line, address)
+
+
+# Listens for samples on address and calls received with every line as it comes in, along with the address of the
+# board that sent it. TCP accepts any number of boards at the same time and calls closed with the address of a board
+# when its connection ends. Returns something with a close method that stops listening.
+async def listen(address, received, closed=None):
+    protocol, host, port = parse_address(address)
+    loop = asyncio.get_running_loop()
+    if protocol == "udp":
+        transport, _ = await loop.create_datagram_endpoint(lambda: _Datagrams(received), local_addr=(host, port))
+        return transport
+
+    async def connection(reader, writer):
+        board = writer.get_extra_info("peername")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received(line.decode("ascii", "replace"), board)
+        finally:
+            writer.close()
+            if closed is not None:
+                closed(board)
+
+    return await asyncio.start_server(connection, host, port)
+
+
+# Stand in for the sensor board. The tilt swings from one side to the other every period seconds, the wobble goes over
+# the attack threshold for a moment every flick seconds. Stops when the listener is not there or goes away, returns the
+# number of samples sent either way.
+def send(address, rate=100, period=4.0, flick=1.5, duration=None):
+    protocol, host, port = parse_address(address)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM if protocol == "udp" else socket.SOCK_STREAM)
+    start = systime.perf_counter()
+    sent = 0
+    try:
+        sock.connect((host, port))
+        while duration is None or sent / rate < duration:
+            elapsed = sent / rate
+            tilt = 30 * math.sin(2 * math.pi * elapsed / period)
+            wobble = 40000 if elapsed % flick < 0.05 else 2000
+            sock.send("{:.1f} {}\n".format(tilt, wobble).encode("ascii"))
+            sent += 1
+            delay = start + sent / rate - systime.perf_counter()
+            if delay > 0:
+                systime.sleep(delay)
+    except OSError as error:
+        # Connection refused for UDP once nobody listens on the port any more, a broken pipe or reset for TCP.
+        print("stopped sending to {}: {}".format(address, error))
+    finally:
+        sock.close()
+    return sent
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sends made up joystick samples, a stand in for the sensor board")
+    parser.add_argument("address", help="udp:host:port or tcp:host:port")
+    parser.add_argument("--rate", type=int, default=100, help="samples per second")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    args = parser.parse_args()
+    try:
+        print("sent {} samples".format(send(args.address, args.rate, duration=args.duration)))
+    except KeyboardInterrupt:
+        pass
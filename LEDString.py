@@ -20,7 +20,10 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import pygame
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 # A lot of this code is ported over from FastLED. This means that a lot of the color magic and the way things are
@@ -30,36 +33,43 @@ import pygame
 
 class LED:
 
+    __slots__ = ("r", "g", "b")
+
     def __init__(self, color=(0, 0, 0)):
         if isinstance(color, tuple):
             self.r, self.g, self.b = color
         elif isinstance(color, LED):
-            self.r, self.g, self.b = color.r, color.b, color.b
+            self.r, self.g, self.b = color.r, color.g, color.b
 
     def rgb(self, color=None):
+        if isinstance(color, LED):
+            color = color.rgb()
         if color:
             self.r, self.g, self.b = color
 
         return self.r, self.g, self.b
 
+    # Adding colors saturates at 255 like the CRGB addition of FastLED. led + color returns a new LED, led += color
+    # changes the LED itself.
     def __add__(self, other):
-        if isinstance(other, tuple):
-            self.r = (self.r + other[0]) % 255
-            self.g = (self.g + other[1]) % 255
-            self.b = (self.b + other[2]) % 255
-        elif isinstance(other, LED):
-            self.r = (self.r + other.r) % 255
-            self.g = (self.g + other.g) % 255
-            self.b = (self.b + other.b) % 255
-        else:
-            raise TypeError("The RHS type is not supported.")
+        return LED(self.rgb()).__iadd__(other)
+
+    def __iadd__(self, other):
+        if isinstance(other, LED):
+            other = other.rgb()
+        elif not isinstance(other, tuple):
+            return NotImplemented
+        self.r = min(self.r + other[0], 255)
+        self.g = min(self.g + other[1], 255)
+        self.b = min(self.b + other[2], 255)
+        return self
 
     def __str__(self):
         return f"({self.r}, {self.g}, {self.b})"
 
     def nhsv_spectrum(self, h, s, v):
         self.r, self.g, self.b = hsv_spectrum(h, s, v)
-        return r, g, b
+        return self.r, self.g, self.b
 
     def nhsv_rainbow(self, h, s, v):
         self.r, self.g, self.b = hsv_rainbow(h, s, v)
@@ -71,14 +81,60 @@ class LED:
         self.b = scale8(self.b, scaler)
 
 
+class LEDView(LED):
+
+    # A single LED inside the framebuffer of an ArrayLEDString. It keeps the LED API but instead of holding its own
+    # color it reads and writes straight through to its row of the shared buffer. The values are handed out as plain
+    # python ints so that the 8bit math in here does not get truncated by numpy uint8 arithmetic.
+
+    __slots__ = ("bytes", "offset")
+
+    # bytes is a flat byte view of the buffer, reading and writing single bytes through it does not allocate anything,
+    # unlike indexing the numpy array.
+    def __init__(self, bytes, index):
+        self.bytes = bytes
+        self.offset = index * 3
+
+    @property
+    def r(self):
+        return self.bytes[self.offset]
+
+    @r.setter
+    def r(self, value):
+        self.bytes[self.offset] = value
+
+    @property
+    def g(self):
+        return self.bytes[self.offset + 1]
+
+    @g.setter
+    def g(self, value):
+        self.bytes[self.offset + 1] = value
+
+    @property
+    def b(self):
+        return self.bytes[self.offset + 2]
+
+    @b.setter
+    def b(self, value):
+        self.bytes[self.offset + 2] = value
+
+    def rgb(self, color=None):
+        if isinstance(color, LED):
+            color = color.rgb()
+        i = self.offset
+        if color:
+            self.bytes[i], self.bytes[i + 1], self.bytes[i + 2] = color
+
+        return self.bytes[i], self.bytes[i + 1], self.bytes[i + 2]
+
+
 class LEDString:
 
-    def __init__(self, length, color=(0, 0, 0), size=8, margin=1):
+    def __init__(self, length, color=(0, 0, 0)):
         self.leds = [LED(color) for _ in range(length)]
         self.color = color
-        self.size = size
-        self.margin = margin
-        self.work_rect = pygame.Rect(margin, margin, size - margin * 2, size - margin * 2)
+        self.colors = [color] * length
 
     def __setitem__(self, n, color):
         self.leds[n].rgb(color)
@@ -90,22 +146,98 @@ class LEDString:
         return len(self.leds)
 
     def __str__(self):
-        return "\n".join(self.leds)
+        return "\n".join(str(led) for led in self)
 
-    def draw(self, screen):
-        self.work_rect.x = 1
-        self.work_rect.y = 1
-        color = pygame.Color(0, 0, 0)
+    # The current colors of the string in a form the frame sinks can consume. Here this is a list of (r, g, b) tuples,
+    # the same list is refilled for every frame.
+    def frame(self):
+        colors = self.colors
+        i = 0
         for led in self.leds:
-            color.r = led.r
-            color.g = led.g
-            color.b = led.b
-            pygame.draw.rect(screen, color.correct_gamma(0.5), self.work_rect)
-            self.work_rect.move_ip(self.size, 0)
+            colors[i] = (led.r, led.g, led.b)
+            i += 1
+        return colors
 
     def clear(self):
-        for i in range(len(self.leds)):
-            self.leds[i].rgb((0, 0, 0))
+        for led in self.leds:
+            led.r = led.g = led.b = 0
+
+    def fill(self, color):
+        for led in self.leds:
+            led.rgb(color)
+
+    def nscale8(self, scaler):
+        for led in self.leds:
+            led.nscale8(scaler)
+
+
+# LED string backed by one contiguous uint8 N x 3 numpy framebuffer instead of a list of LED objects. Indexing a single
+# LED hands out a lightweight LEDView so that the rest of the code can keep using the LED API, while whole string
+# operations like clear, nscale8 and slice assignment become single vectorized operations on the buffer.
+class ArrayLEDString(LEDString):
+
+    def __init__(self, length, color=(0, 0, 0)):
+        if np is None:
+            raise ImportError("ArrayLEDString requires numpy.")
+        self.buffer = np.empty((length, 3), dtype=np.uint8)
+        self.buffer[:] = color
+        self.color = color
+        self.bytes = memoryview(self.buffer).cast("B")
+        # Scratch space for nscale8
+        self.scaled = np.empty((length, 3), dtype=np.uint16)
+
+    def __setitem__(self, n, color):
+        if isinstance(color, LED):
+            color = color.rgb()
+        if isinstance(n, int):
+            # Single LEDs are written byte by byte, numpy would turn the color into a temporary array first.
+            length = len(self.buffer)
+            if n < -length or n >= length:
+                raise IndexError("LED index out of range")
+            i = n % length * 3
+            self.bytes[i], self.bytes[i + 1], self.bytes[i + 2] = color
+            return
+        self.buffer[n] = color
+
+    def __getitem__(self, n):
+        if isinstance(n, slice):
+            # Slices are handed out as a view into the framebuffer so that they can be operated on in one go.
+            return self.buffer[n]
+        length = len(self.buffer)
+        if n < -length or n >= length:
+            raise IndexError("LED index out of range")
+        return LEDView(self.bytes, n % length)
+
+    def __iter__(self):
+        for i in range(len(self.buffer)):
+            yield LEDView(self.bytes, i)
+
+    def __len__(self):
+        return len(self.buffer)
+
+    # The framebuffer itself, sinks must not hold on to it past the show call.
+    def frame(self):
+        return self.buffer
+
+    # Makes the string draw into another framebuffer of the same shape from now on, see Pipeline.FramePipeline.
+    def set_buffer(self, buffer):
+        self.buffer = buffer
+        self.bytes = memoryview(buffer).cast("B")
+
+    def clear(self):
+        self.buffer.fill(0)
+
+    def fill(self, color):
+        self.buffer[:] = color
+
+    def nscale8(self, scaler):
+        # The intermediate product does not fit into 8bit, so we do the math in a 16bit scratch copy.
+        scaled = self.scaled
+        np.copyto(scaled, self.buffer)
+        np.multiply(scaled, scaler, out=scaled)
+        np.floor_divide(scaled, 255, out=scaled)
+        np.copyto(self.buffer, scaled, casting="unsafe")
+
 
 # scale one byte by a second one, which is treated as the numerator of a fraction whose denominator is 256
 # In other words, it computes i * (scale / 256)
@@ -127,8 +259,8 @@ def scale8_video(val, scaler):
 
 
 # HSV conversion constants
-__hsv_section_6 = 0x40
-__hsv_section_3 = 0x20
+__hsv_section_6 = 0x20
+__hsv_section_3 = 0x40
 
 
 def __hsv_raw(h, s, v):
@@ -147,11 +279,11 @@ def __hsv_raw(h, s, v):
     color_amplitude = v - brightness_floor
 
     # Figuer out which section of the hue wheel we're in, and how far offset we are within that section
-    section = h // LED.__hsv_section_3  # 0..2
-    offset = h % LED.__hsv_section_3   # 0..63
+    section = h // __hsv_section_3  # 0..2
+    offset = h % __hsv_section_3   # 0..63
 
     rampup = offset  # 0..63
-    rampdown = (LED.__hsv_section_3 - 1) - offset  # 63..0
+    rampdown = (__hsv_section_3 - 1) - offset  # 63..0
 
     # We now scale rampup and rampdown to a 0..255 range
 
@@ -198,7 +330,9 @@ def hsv_spectrum(h, s, v):
     return __hsv_raw(h, s, v)
 
 
-def hsv_rainbow(h, s, v):
+# Computes the fully saturated full brightness rainbow color for a hue. This is only used to fill the hue table below,
+# hsv_rainbow and hsv_rainbow_array then only have to deal with the saturation and value scaling.
+def _rainbow_hue(h):
 
     # Yellow has a higher inherent brightness than any other color; pure yellow is perceived to be 93% as bright
     # as white. In order to make yellow appear the correct relative brightness, it has to be rendered brighter
@@ -216,11 +350,6 @@ def hsv_rainbow(h, s, v):
     # Depends GREATLY on your particular LEDs
     g_scale = 0
 
-    # in spirit of c code we will wrap the values into the uint8 range
-    h %= 256
-    s %= 256
-    v %= 256
-
     offset = h & 0x1F
 
     offset8 = (offset << 3) % 256
@@ -303,6 +432,24 @@ def hsv_rainbow(h, s, v):
     if g_scale:
         g = scale8_video(g, g_scale)
 
+    return r, g, b
+
+
+# Rainbow colors for all 256 hues, precomputed once at import time.
+_rainbow_table = [_rainbow_hue(h) for h in range(256)]
+if np is not None:
+    _rainbow_table_array = np.array(_rainbow_table, dtype=np.int32)
+
+
+def hsv_rainbow(h, s, v):
+
+    # in spirit of c code we will wrap the values into the uint8 range
+    h %= 256
+    s %= 256
+    v %= 256
+
+    r, g, b = _rainbow_table[h]
+
     # Scale down colors if we're desaturated at all
     # and add the brightness_floor to r, g, and b.
     if s != 255:
@@ -340,3 +487,55 @@ def hsv_rainbow(h, s, v):
                 b = scale8(b, v)
 
     return r, g, b
+
+
+# Batch versions of the conversions above. They take scalars or arrays of h, s and v (broadcast against each other) and
+# return an array of the broadcast shape with an additional axis of length 3 holding uint8 r, g, b values. The results
+# are bit exact with the scalar functions, they just do the per pixel branching with masks.
+
+def _hsv_arrays(h, s, v):
+    return np.broadcast_arrays(np.asarray(h, dtype=np.int32) % 256,
+                               np.asarray(s, dtype=np.int32) % 256,
+                               np.asarray(v, dtype=np.int32) % 256)
+
+
+def hsv_rainbow_array(h, s, v):
+    h, s, v = _hsv_arrays(h, s, v)
+    rgb = _rainbow_table_array[h]
+    s = s[..., np.newaxis]
+    v = v[..., np.newaxis]
+
+    # Scale down colors if we're desaturated at all and add the brightness floor.
+    desat = 255 - s
+    desat = scale8(desat, desat)
+    rgb = np.where(s == 255, rgb, np.where(s == 0, 255, scale8(rgb, s) + desat))
+
+    # Now scale everything down if we're at value < 255, scale8_video(v, v) is only zero when v is.
+    video_v = ((v * v) >> 8) + (v != 0)
+    rgb = np.where(v == 255, rgb, scale8(rgb, video_v))
+
+    return rgb.astype(np.uint8)
+
+
+def _hsv_raw_array(h, s, v):
+    h, s, v = _hsv_arrays(h, s, v)
+
+    brightness_floor = (v * (255 - s)) // 256
+    color_amplitude = v - brightness_floor
+
+    section = h // __hsv_section_3
+    offset = h % __hsv_section_3
+    up = (offset * color_amplitude) // (256 // 4) + brightness_floor
+    down = ((__hsv_section_3 - 1 - offset) * color_amplitude) // (256 // 4) + brightness_floor
+
+    # Each section is a different arrangement of floor, rampup and rampdown over the three channels.
+    rgb = np.empty(h.shape + (3,), dtype=np.uint8)
+    rgb[..., 0] = np.where(section == 0, down, np.where(section == 1, brightness_floor, up))
+    rgb[..., 1] = np.where(section == 0, up, np.where(section == 1, down, brightness_floor))
+    rgb[..., 2] = np.where(section == 0, brightness_floor, np.where(section == 1, up, down))
+    return rgb
+
+
+def hsv_spectrum_array(h, s, v):
+    h = scale8(np.asarray(h, dtype=np.int32) % 256, 191)
+    return _hsv_raw_array(h, s, v)
@@ -0,0 +1,164 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from FrameSink import TeeSink
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Maps the logical LED string the game draws into onto the physical LEDs of an installation. Long installations are
+# usually built from several strips, fed from different outputs, and strips are often mounted back and forth so every
+# other one runs in reverse.
+
+# A segment takes length LEDs of the logical string, starting at start, and puts them on output starting at offset. The
+# offset wraps around the end of the output, which covers rings where the data input is not at the logical start.
+class Segment:
+
+    def __init__(self, start, length, output=0, offset=0, reverse=False):
+        self.start = start
+        self.length = length
+        self.output = output
+        self.offset = offset
+        self.reverse = reverse
+
+    def __repr__(self):
+        return "Segment({}, {}, output={}, offset={}, reverse={})".format(self.start, self.length, self.output,
+                                                                         self.offset, self.reverse)
+
+
+class Layout:
+
+    # Output lengths default to just covering the segments placed on each output. LEDs of an output that no segment
+    # covers stay black.
+    def __init__(self, segments, output_lengths=None):
+        self.segments = list(segments)
+        self.length = max(segment.start + segment.length for segment in self.segments)
+        outputs = max(segment.output for segment in self.segments) + 1
+        if output_lengths is None:
+            output_lengths = [0] * outputs
+            for segment in self.segments:
+                output_lengths[segment.output] = max(output_lengths[segment.output], segment.offset + segment.length)
+        self.output_lengths = list(output_lengths)
+
+        # All the work is done here, once. For every output we build the list of logical LEDs to take each physical LED
+        # from, with self.length standing for black, so mapping a frame is a single gather per output no matter how many
+        # segments there are.
+        self.gather = []
+        for output_length in self.output_lengths:
+            self.gather.append([self.length] * output_length)
+        for segment in self.segments:
+            output_length = self.output_lengths[segment.output]
+            if segment.length > output_length:
+                raise ValueError("{} does not fit on an output of {} LEDs".format(segment, output_length))
+            gather = self.gather[segment.output]
+            for i in range(segment.length):
+                led = segment.start + (segment.length - 1 - i if segment.reverse else i)
+                gather[(segment.offset + i) % output_length] = led
+
+        if np is not None:
+            self.gather = [np.array(gather, dtype=np.intp) for gather in self.gather]
+            # The logical frame is copied in front of a black LED, and the outputs are gathered into preallocated
+            # buffers, so mapping does not allocate anything.
+            self.scratch = np.zeros((self.length + 1, 3), dtype=np.uint8)
+            self.outputs = [np.zeros((output_length, 3), dtype=np.uint8) for output_length in self.output_lengths]
+
+    # The same layout with all outputs put one after the other on a single output, for showing all of them in one place.
+    def flatten(self):
+        starts = [0]
+        for output_length in self.output_lengths:
+            starts.append(starts[-1] + output_length)
+        segments = [Segment(segment.start, segment.length, offset=starts[segment.output] + segment.offset,
+                            reverse=segment.reverse) for segment in self.segments]
+        # Wrapping segments have to keep wrapping inside their own output, those get split in two.
+        flat = []
+        for segment, original in zip(segments, self.segments):
+            fits = self.output_lengths[original.output] - original.offset
+            if segment.length <= fits:
+                flat.append(segment)
+                continue
+            head = Segment(segment.start, fits, offset=segment.offset)
+            tail = Segment(segment.start + fits, segment.length - fits, offset=starts[original.output])
+            if segment.reverse:
+                head = Segment(segment.start + segment.length - fits, fits, offset=segment.offset, reverse=True)
+                tail = Segment(segment.start, segment.length - fits, offset=starts[original.output], reverse=True)
+            flat.extend((head, tail))
+        return Layout(flat, [starts[-1]])
+
+    # Returns the frames of all outputs for a logical frame. With numpy the returned arrays are reused for the next
+    # call.
+    def map(self, frame):
+        if np is not None and isinstance(frame, np.ndarray):
+            self.scratch[:self.length] = frame
+            for gather, output in zip(self.gather, self.outputs):
+                np.take(self.scratch, gather, axis=0, out=output)
+            return self.outputs
+        frame = list(frame) + [(0, 0, 0)]
+        return [[frame[led] for led in gather] for gather in self.gather]
+
+
+# Parses a layout description like "300,300r,300@1". Every comma separated entry is a segment of that many LEDs, an r
+# suffix reverses it and @n puts it on output n. Segments take consecutive parts of the logical string and are placed
+# one after the other on their output.
+def parse_layout(description):
+    segments = []
+    start = 0
+    offsets = {}
+    for entry in description.split(","):
+        entry = entry.strip()
+        output = 0
+        if "@" in entry:
+            entry, output = entry.split("@")
+            output = int(output)
+        reverse = entry.endswith("r")
+        if reverse:
+            entry = entry[:-1]
+        length = int(entry)
+        offset = offsets.get(output, 0)
+        segments.append(Segment(start, length, output=output, offset=offset, reverse=reverse))
+        offsets[output] = offset + length
+        start += length
+    return Layout(segments)
+
+
+# Sends the outputs of a layout to one sink each.
+class MappedSink(TeeSink):
+
+    def __init__(self, layout, sinks):
+        if len(sinks) != len(layout.output_lengths):
+            raise ValueError("layout has {} outputs but {} sinks were given".format(len(layout.output_lengths),
+                                                                                  len(sinks)))
+        super().__init__(sinks)
+        self.layout = layout
+
+    def show(self, frame):
+        for sink, output in zip(self.sinks, self.layout.map(frame)):
+            sink.show(output)
+
+    def render(self, frame):
+        for sink, output in zip(self.sinks, self.layout.map(frame)):
+            if hasattr(sink, "render"):
+                sink.render(output)
+            else:
+                sink.show(output)
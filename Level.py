@@ -0,0 +1,152 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Levels and the spawning of their enemies.
+#
+# Levels are described in JSON, see levels.json. Positions are given from 0 to 1000 like in the Arduino TWANG, so the
+# same levels work on strings of any length. A level has
+#   enemies   placed when the level starts: position, speed and wobble
+#   waves     groups of enemies placed time milliseconds into the level
+#   spawners  spawning an enemy every interval milliseconds, starting after delay, count times or forever
+#   lava      stretches from left to right that are hot for on milliseconds, then cool for off, starting after offset
+#   conveyors stretches from left to right that move whatever is on them by speed LEDs per step
+#   exit      where the player leaves the level for the next one, the end of the string if not given
+#
+# Loading compiles every level into a table of spawn rows, one per enemy, wave member or spawner, with the positions
+# already mapped to LEDs. Starting a level only puts its rows into a heap ordered by when they are due next, and every
+# step pops the rows that are due, so the cost per step depends on what spawns and not on how many spawners there are.
+# Lava and conveyors are compiled into per LED arrays that the Hazards of the game switch to, see Hazard.py.
+
+import heapq
+import json
+import os
+
+import numpy as np
+
+DEFAULT_LEVELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels.json")
+
+
+class CompiledLevel:
+
+    def __init__(self, name, rows, exit, lava, conveyor):
+        self.name = name
+        # (time, position, speed, wobble, interval, count) with count -1 spawning forever
+        self.rows = rows
+        self.exit = exit
+        # (left, right, on, off, offset) in LEDs and milliseconds, plus all the LEDs that are lava at some point
+        self.lava = lava
+        self.lava_zone = np.zeros(len(conveyor), dtype=bool)
+        for left, right, _, _, _ in lava:
+            self.lava_zone[left:right + 1] = True
+        # Speed every LED moves things by
+        self.conveyor = conveyor
+        # Heap the level starts with, entries are (due, row, spawns left).
+        self.queue = [(row[0], i, row[5]) for i, row in enumerate(rows)]
+        heapq.heapify(self.queue)
+
+
+def compile_level(level, length):
+    def led(position):
+        if not 0 <= position <= 1000:
+            raise ValueError("level {}: position {} is not between 0 and 1000".format(name, position))
+        return (position * (length - 1) + 500) // 1000
+
+    def enemy(time, entry, interval=0, count=1):
+        return (time, led(entry["position"]), entry.get("speed", 0), entry.get("wobble", 0), interval, count)
+
+    name = level.get("name", "")
+    rows = [enemy(0, entry) for entry in level.get("enemies", ())]
+    for wave in level.get("waves", ()):
+        rows.extend(enemy(wave["time"], entry) for entry in wave["enemies"])
+    for spawner in level.get("spawners", ()):
+        if spawner["interval"] <= 0:
+            raise ValueError("level {}: spawner interval has to be positive".format(name))
+        count = spawner.get("count")
+        if count is not None and count < 1:
+            raise ValueError("level {}: spawner count has to be at least 1".format(name))
+        rows.append(enemy(spawner.get("delay", 0), spawner, spawner["interval"], -1 if count is None else count))
+    lava = []
+    for entry in level.get("lava", ()):
+        if entry["on"] < 0 or entry["off"] <= 0:
+            raise ValueError("level {}: lava needs a positive off time".format(name))
+        lava.append((led(entry["left"]), led(entry["right"]), entry["on"], entry["off"], entry.get("offset", 0)))
+    conveyor = np.zeros(length, dtype=np.int64)
+    for entry in level.get("conveyors", ()):
+        conveyor[led(entry["left"]):led(entry["right"]) + 1] = entry["speed"]
+    return CompiledLevel(name, rows, led(level.get("exit", 1000)), lava, conveyor)
+
+
+def load_levels(length, path=DEFAULT_LEVELS):
+    with open(path) as file:
+        levels = json.load(file)["levels"]
+    if not levels:
+        raise ValueError("{} does not contain any levels".format(path))
+    return [compile_level(level, length) for level in levels]
+
+
+# Runs the levels of a game: starts them, spawns their enemies when they are due and moves on to the next level when
+# the player reaches the exit, starting over after the last one.
+class LevelEngine:
+
+    def __init__(self, game, levels, start=0):
+        self.game = game
+        self.levels = levels
+        self.index = 0
+        self.level = None
+        self.queue = []
+        self.start_time = 0
+        self.start(start, 0)
+
+    def start(self, index, time):
+        game = self.game
+        self.index = index % len(self.levels)
+        self.level = self.levels[self.index]
+        self.queue = list(self.level.queue)
+        self.start_time = time
+        game.enemies.clear()
+        game.hazards.load(self.level, time)
+        game.player.position = 0
+        game.player.attacking = False
+        # Enemies that are there from the start show up right away.
+        self.tick(time)
+
+    def tick(self, time):
+        if self.game.player.position >= self.level.exit:
+            self.start(self.index + 1, time)
+            return
+
+        elapsed = time - self.start_time
+        queue = self.queue
+        rows = self.level.rows
+        enemies = self.game.enemies
+        while queue and queue[0][0] <= elapsed:
+            due, row, left = queue[0]
+            _, position, speed, wobble, interval, _ = rows[row]
+            enemies.spawn(position, speed, wobble)
+            if left == 1:
+                heapq.heappop(queue)
+            else:
+                heapq.heapreplace(queue, (due + interval, row, left - 1 if left > 0 else -1))
+
+    # Level number, time into the level and the pending spawns, for Game.state().
+    def state(self):
+        return self.index, self.start_time, sorted(self.queue)
@@ -0,0 +1,274 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Frame sinks for LED pixel controllers on the network, speaking either DDP or E1.31 (sACN) over UDP.
+#
+# The packet headers are built once when the sink is opened, for every frame only the sequence numbers get patched in
+# and the pixel data is handed to the socket as memoryview slices of the framebuffer next to the header, so nothing is
+# copied pixel by pixel in python. Frames are paced to a fixed rate: frames coming in faster than that are dropped (or
+# waited for, depending on the pacing policy), frames sent more than half a frame after they were due count as late.
+
+import socket
+import struct
+import time as systime
+import uuid
+
+from FrameSink import FrameSink
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class NetworkSink(FrameSink):
+
+    def __init__(self, host, port, fps=60, pacing="drop"):
+        if pacing not in ("drop", "wait"):
+            raise ValueError("pacing has to be drop or wait")
+        self.host = host
+        self.port = port
+        self.period = 1 / fps if fps else 0
+        self.pacing = pacing
+        self.socket = None
+        self.headers = []
+        self.sequence = 0
+        self.next_due = None
+        self.frames = 0
+        self.dropped = 0
+        self.late = 0
+        self.packets = 0
+        self.bytes = 0
+
+    def open(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.socket.connect((self.host, self.port))
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def stats(self):
+        return {"frames": self.frames, "dropped": self.dropped, "late": self.late,
+                "packets": self.packets, "bytes": self.bytes}
+
+    def show(self, frame):
+        if not self.__pace():
+            self.dropped += 1
+            return
+        data = _frame_bytes(frame)
+        if not self.headers:
+            self.headers = self.build_headers(len(data))
+        self.sequence = self.next_sequence(self.sequence)
+        try:
+            for header, start, end in self.headers:
+                self.patch_header(header, self.sequence)
+                self.__send(header, data[start:end])
+        except (BlockingIOError, ConnectionRefusedError):
+            # The socket buffer is full or the controller is not listening (yet), there is no point in sending the rest
+            # of this frame.
+            self.dropped += 1
+            return
+        self.frames += 1
+
+    # Decides if the frame goes out now. Returns False if it is to be dropped because it came in too early.
+    def __pace(self):
+        if not self.period:
+            return True
+        now = systime.perf_counter()
+        if self.next_due is None:
+            self.next_due = now
+        if now < self.next_due:
+            # Frames less than half a frame early are just jitter of whoever calls us, those go out right away.
+            if self.pacing == "drop" and now < self.next_due - self.period / 2:
+                return False
+            if self.pacing == "wait":
+                systime.sleep(self.next_due - now)
+                now = self.next_due
+        elif now > self.next_due + self.period / 2:
+            self.late += 1
+        self.next_due += self.period
+        if self.next_due < now:
+            # We fell behind more than a whole frame, start over from here instead of rushing the following frames out.
+            self.next_due = now + self.period
+        return True
+
+    def __send(self, header, payload):
+        if hasattr(self.socket, "sendmsg"):
+            self.socket.sendmsg([header, payload])
+        else:
+            self.socket.send(bytes(header) + bytes(payload))
+        self.packets += 1
+        self.bytes += len(header) + len(payload)
+
+    # Returns a list of (header, start, end) for all packets of a frame with size bytes, start and end being the slice
+    # of the frame data that goes with the header.
+    def build_headers(self, size):
+        raise NotImplementedError
+
+    def next_sequence(self, sequence):
+        return (sequence + 1) % 256
+
+    def patch_header(self, header, sequence):
+        raise NotImplementedError
+
+
+# The pixel data of a frame as a flat byte memoryview, without copying if it is a numpy framebuffer already.
+def _frame_bytes(frame):
+    if np is not None and isinstance(frame, np.ndarray):
+        return memoryview(np.ascontiguousarray(frame, dtype=np.uint8)).cast("B")
+    return memoryview(bytes(value for color in frame for value in color))
+
+
+# Distributed Display Protocol, http://www.3waylabs.com/ddp/
+# Every packet has a 10 byte header with flags, sequence, data type, destination id, the byte offset of the data in
+# the frame and its length. The last packet of a frame has the push flag set, which makes the controller show it.
+DDP_PORT = 4048
+DDP_VERSION_1 = 0x40
+DDP_PUSH = 0x01
+DDP_TYPE_RGB8 = 0x0B
+DDP_ID_DISPLAY = 1
+DDP_MAX_DATA = 1440
+_ddp_header = struct.Struct(">BBBBLH")
+
+
+class DDPSink(NetworkSink):
+
+    def __init__(self, host, port=DDP_PORT, fps=60, pacing="drop"):
+        super().__init__(host, port, fps, pacing)
+
+    def build_headers(self, size):
+        headers = []
+        for start in range(0, size, DDP_MAX_DATA):
+            end = min(start + DDP_MAX_DATA, size)
+            flags = DDP_VERSION_1 | (DDP_PUSH if end == size else 0)
+            headers.append((bytearray(_ddp_header.pack(flags, 0, DDP_TYPE_RGB8, DDP_ID_DISPLAY, start, end - start)),
+                            start, end))
+        return headers
+
+    def next_sequence(self, sequence):
+        # DDP sequence numbers are 4 bits, 0 means not used.
+        return sequence % 15 + 1
+
+    def patch_header(self, header, sequence):
+        header[1] = sequence
+
+
+# Decodes a DDP packet into (offset, data, push).
+def decode_ddp(packet):
+    flags, sequence, data_type, destination, offset, length = _ddp_header.unpack_from(packet)
+    return offset, packet[_ddp_header.size:_ddp_header.size + length], bool(flags & DDP_PUSH)
+
+
+# E1.31 (streaming ACN), ANSI E1.31-2016
+# Every universe carries 512 DMX channels, we put 170 RGB pixels into each so that pixels do not get split between
+# universes. A packet is the root layer, the framing layer and the DMP layer followed by the channel data.
+E131_PORT = 5568
+E131_CHANNELS = 510
+E131_HEADER_SIZE = 126
+E131_SEQUENCE_OFFSET = 111
+_e131_acn_id = b"ASC-E1.17\x00\x00\x00"
+
+
+class E131Sink(NetworkSink):
+
+    def __init__(self, host, port=E131_PORT, fps=60, pacing="drop", universe=1, source_name="pyTWANG",
+                 priority=100):
+        super().__init__(host, port, fps, pacing)
+        self.universe = universe
+        self.source_name = source_name
+        self.priority = priority
+        self.cid = uuid.uuid4().bytes
+
+    def build_headers(self, size):
+        headers = []
+        for n, start in enumerate(range(0, size, E131_CHANNELS)):
+            end = min(start + E131_CHANNELS, size)
+            headers.append((self.__header(self.universe + n, end - start), start, end))
+        return headers
+
+    def __header(self, universe, channels):
+        length = E131_HEADER_SIZE + channels
+        header = bytearray()
+        # Root layer
+        header += struct.pack(">HH12sHL16s", 0x0010, 0x0000, _e131_acn_id, 0x7000 | (length - 16), 0x00000004,
+                              self.cid)
+        # Framing layer
+        header += struct.pack(">HL64sBHBBH", 0x7000 | (length - 38), 0x00000002,
+                              self.source_name.encode("utf-8")[:63], self.priority, 0, 0, 0, universe)
+        # DMP layer, the property values are the start code followed by the channels
+        header += struct.pack(">HBBHHHB", 0x7000 | (length - 115), 0x02, 0xa1, 0x0000, 0x0001, channels + 1, 0x00)
+        return header
+
+    def patch_header(self, header, sequence):
+        header[E131_SEQUENCE_OFFSET] = sequence
+
+
+# Decodes an E1.31 data packet into (universe, sequence, data).
+def decode_e131(packet):
+    if packet[4:16] != _e131_acn_id:
+        raise ValueError("not an E1.31 packet")
+    universe, = struct.unpack_from(">H", packet, 113)
+    count, = struct.unpack_from(">H", packet, 123)
+    return universe, packet[E131_SEQUENCE_OFFSET], packet[E131_HEADER_SIZE:E131_HEADER_SIZE + count - 1]
+
+
+# Listens on a local UDP port and puts the frames a DDPSink or E131Sink sends back together, a stand in for a pixel
+# controller to test against. receive returns the next complete frame as bytes, or None on timeout.
+class FrameReceiver:
+
+    def __init__(self, protocol, length, host="127.0.0.1", port=0, universe=1):
+        self.protocol = protocol
+        self.size = length * 3
+        self.universe = universe
+        self.universes = -(-self.size // E131_CHANNELS)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.port = self.socket.getsockname()[1]
+        self.frame = bytearray(self.size)
+        self.seen = set()
+
+    def close(self):
+        self.socket.close()
+
+    def receive(self, timeout=1.0):
+        self.socket.settimeout(timeout)
+        while True:
+            try:
+                packet = self.socket.recv(2048)
+            except socket.timeout:
+                return None
+            if self.protocol == "ddp":
+                offset, data, push = decode_ddp(packet)
+                self.frame[offset:offset + len(data)] = data
+                if push:
+                    return bytes(self.frame)
+            else:
+                universe, sequence, data = decode_e131(packet)
+                offset = (universe - self.universe) * E131_CHANNELS
+                self.frame[offset:offset + len(data)] = data
+                self.seen.add(universe)
+                if len(self.seen) == self.universes:
+                    self.seen.clear()
+                    return bytes(self.frame)
@@ -0,0 +1,134 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Color palettes in the spirit of FastLED. A palette has 16 colors, which are blended into a table of 256 colors once
+# when the palette is created. Coloring LEDs is then a lookup into that table for a whole array of indices at once,
+# instead of color math for every pixel.
+#
+# The blending and the brightness use the scale8 of lib8tion like FastLED's ColorFromPalette, not the scale8 of
+# LEDString, which divides by 255.
+
+import LEDString
+from lib8tion import scale8
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class Palette:
+
+    def __init__(self, entries):
+        if np is None:
+            raise ImportError("Palette requires numpy.")
+        if len(entries) != 16:
+            raise ValueError("a palette has 16 entries")
+        self.entries = [tuple(entry) for entry in entries]
+
+        # Index i takes entry i >> 4 and blends it with the next one, wrapping around from the last to the first, by
+        # the low 4 bits, like ColorFromPalette with LINEARBLEND.
+        index = np.arange(256)
+        entries = np.array(self.entries, dtype=np.int32)
+        first = entries[index >> 4]
+        second = entries[((index >> 4) + 1) % 16]
+        fraction = ((index & 0x0F) << 4)[:, np.newaxis]
+        self.table = (scale8(first, 255 - fraction) + scale8(second, fraction)).astype(np.uint8)
+
+    # A palette from a gradient, given as (position, color) anchors with positions from 0 to 255 in increasing order.
+    # The 16 entries are sampled from the gradient at 0, 17, 34, ... 255.
+    @classmethod
+    def from_gradient(cls, anchors):
+        positions = [position for position, _ in anchors]
+        colors = np.array([color for _, color in anchors], dtype=np.float64)
+        samples = np.arange(16) * 17
+        entries = np.stack([np.interp(samples, positions, colors[:, channel]) for channel in range(3)], axis=1)
+        return cls(np.round(entries).astype(int).tolist())
+
+    # A palette straight from a 256 color table, for colors that do not come from 16 entries.
+    @classmethod
+    def from_table(cls, table):
+        palette = cls.__new__(cls)
+        palette.table = np.asarray(table, dtype=np.uint8).reshape(256, 3)
+        palette.entries = [tuple(color) for color in palette.table[::16].tolist()]
+        return palette
+
+
+# Colors for an array of palette indices at a brightness, which can be a scalar or an array broadcasting against the
+# indices. Returns uint8 r, g, b along an extra last axis, written into out if given.
+def color_from_palette(palette, indices, brightness=255, out=None):
+    indices = np.asarray(indices) & 0xFF
+    if np.isscalar(brightness) and brightness == 255:
+        if out is None:
+            return palette.table[indices]
+        np.take(palette.table, indices, axis=0, out=out)
+        return out
+    # Like ColorFromPalette, a brightness other than zero goes up by one before scaling, and zero is black.
+    brightness = np.asarray(brightness, dtype=np.int32)[..., np.newaxis]
+    colors = scale8(palette.table[indices].astype(np.int32), np.where(brightness > 0, brightness + 1, -1))
+    if out is None:
+        return colors.astype(np.uint8)
+    np.copyto(out, colors, casting="unsafe")
+    return out
+
+
+# Fills the LEDs from start to end with palette colors, starting at start_index and going up by increment per LED like
+# FastLED's fill_palette.
+def fill_palette(ledstring, palette, start_index, increment, brightness=255, start=0, end=None):
+    end = len(ledstring) if end is None else end
+    indices = start_index + increment * np.arange(end - start)
+    if hasattr(ledstring, "buffer"):
+        color_from_palette(palette, indices, brightness, out=ledstring.buffer[start:end])
+    else:
+        for i, color in enumerate(color_from_palette(palette, indices, brightness).tolist(), start):
+            ledstring[i].rgb(tuple(color))
+
+
+# The hsv_rainbow colors of all hues at a saturation and value, bit exact with LEDString.hsv_rainbow. Tables are made
+# the first time they are asked for and kept.
+_rainbow_palettes = {}
+
+
+def rainbow_palette(s=255, v=255):
+    palette = _rainbow_palettes.get((s, v))
+    if palette is None:
+        palette = Palette.from_table(LEDString.hsv_rainbow_array(np.arange(256), s, v))
+        _rainbow_palettes[(s, v)] = palette
+    return palette
+
+
+# Some of the palettes that come with FastLED.
+if np is not None:
+    RAINBOW = Palette([(0xFF, 0x00, 0x00), (0xD5, 0x2A, 0x00), (0xAB, 0x55, 0x00), (0xAB, 0x7F, 0x00),
+                       (0xAB, 0xAB, 0x00), (0x56, 0xD5, 0x00), (0x00, 0xFF, 0x00), (0x00, 0xD5, 0x2A),
+                       (0x00, 0xAB, 0x55), (0x00, 0x56, 0xAA), (0x00, 0x00, 0xFF), (0x2A, 0x00, 0xD5),
+                       (0x55, 0x00, 0xAB), (0x7F, 0x00, 0x81), (0xAB, 0x00, 0x55), (0xD5, 0x00, 0x2B)])
+
+    LAVA = Palette([(0x00, 0x00, 0x00), (0x80, 0x00, 0x00), (0x00, 0x00, 0x00), (0x80, 0x00, 0x00),
+                    (0x8B, 0x00, 0x00), (0x8B, 0x00, 0x00), (0x80, 0x00, 0x00), (0x8B, 0x00, 0x00),
+                    (0x8B, 0x00, 0x00), (0x8B, 0x00, 0x00), (0xFF, 0x00, 0x00), (0xFF, 0xA5, 0x00),
+                    (0xFF, 0xFF, 0xFF), (0xFF, 0xA5, 0x00), (0xFF, 0x00, 0x00), (0x8B, 0x00, 0x00)])
+
+    HEAT = Palette([(0x00, 0x00, 0x00), (0x33, 0x00, 0x00), (0x66, 0x00, 0x00), (0x99, 0x00, 0x00),
+                    (0xCC, 0x00, 0x00), (0xFF, 0x00, 0x00), (0xFF, 0x33, 0x00), (0xFF, 0x66, 0x00),
+                    (0xFF, 0x99, 0x00), (0xFF, 0xCC, 0x00), (0xFF, 0xFF, 0x00), (0xFF, 0xFF, 0x33),
+                    (0xFF, 0xFF, 0x66), (0xFF, 0xFF, 0x99), (0xFF, 0xFF, 0xCC), (0xFF, 0xFF, 0xFF)])
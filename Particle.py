@@ -0,0 +1,176 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Short lived sparks for explosions and the like. All particles live in a fixed size pool of arrays that is allocated
+# once, every step moves all of them at the same time and drawing adds them on top of what is already on the LED string,
+# saturating at full brightness.
+#
+# Motion works like the particles of the Arduino TWANG: they fly off with some speed, slow down, bounce off the ends of
+# the string losing half their speed and fade out over their life.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class ParticlePool:
+
+    def __init__(self, ledstring, world, capacity=1024, friction=0.9, seed=None):
+        self.ledstring = ledstring
+        self.world = world
+        self.capacity = capacity
+        self.friction = friction
+        self.random = np.random.default_rng(seed)
+        self.position = np.zeros(capacity, dtype=np.float64)
+        self.velocity = np.zeros(capacity, dtype=np.float64)
+        # Steps left to live and steps the particle was born with, the brightness is the ratio of the two.
+        self.life = np.zeros(capacity, dtype=np.int32)
+        self.lifetime = np.ones(capacity, dtype=np.int32)
+        self.color = np.zeros((capacity, 3), dtype=np.uint8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.live = 0
+        # Slots from here on have never been used since the pool was last empty. Bursts take the lowest free slots, so
+        # the live particles stay at the front and drawing only looks at the slots before this.
+        self.end = 0
+
+        # Scratch space, so that ticking and drawing do not allocate anything that grows with the number of particles.
+        self.bounced = np.zeros(capacity, dtype=bool)
+        self.index = np.zeros(capacity, dtype=np.intp)
+        self.rounded = np.zeros(capacity, dtype=np.float64)
+        # Channel major, so that every channel is one contiguous row.
+        self.light = np.zeros((3, capacity), dtype=np.int32)
+        self.sums = np.zeros(capacity, dtype=np.int32)
+        self.wide = np.zeros(capacity, dtype=np.int32)
+        self.pixels = np.zeros(capacity, dtype=np.intp)
+        self.values = np.zeros(capacity, dtype=np.uint8)
+        self.accumulator = np.zeros(len(ledstring), dtype=np.int32)
+        world["particles"] = self
+
+    def __len__(self):
+        return self.live
+
+    # Throws count particles of color in all directions from position, with speeds of up to speed LEDs per step. When
+    # the pool is full the rest of the burst is dropped, the pool never grows.
+    def burst(self, position, count, color, speed=3.0, life=30):
+        slots = self.__free_slots(count)
+        count = len(slots)
+        if not count:
+            return
+        self.position[slots] = min(max(position, 0), len(self.ledstring) - 1)
+        self.velocity[slots] = self.random.uniform(-speed, speed, count)
+        lifetime = self.random.integers(life // 2, life, endpoint=True, size=count)
+        self.life[slots] = lifetime
+        self.lifetime[slots] = lifetime
+        self.color[slots] = color
+        self.alive[slots] = True
+        self.live += count
+        self.end = max(self.end, int(slots[-1]) + 1)
+
+    # The lowest count free slots. They are looked for a chunk of the pool at a time, so that finding them does not
+    # allocate with the size of the pool.
+    def __free_slots(self, count, chunk=64):
+        found = []
+        missing = count
+        for start in range(0, self.capacity, chunk):
+            alive = self.alive[start:start + chunk]
+            free = self.bounced[:len(alive)]
+            np.logical_not(alive, out=free)
+            slots = np.flatnonzero(free)[:missing] + start
+            found.append(slots)
+            missing -= len(slots)
+            if not missing:
+                break
+        return np.concatenate(found)
+
+    def tick(self, time):
+        if not self.live:
+            return
+        position = self.position
+        velocity = self.velocity
+        bounced = self.bounced
+        last = len(self.ledstring) - 1
+
+        # Dead particles have no speed, so everything can be moved at once without picking out the live ones.
+        np.multiply(velocity, self.friction, out=velocity)
+        np.add(position, velocity, out=position)
+        np.less(position, 0, out=bounced)
+        np.negative(position, out=position, where=bounced)
+        np.multiply(velocity, -0.5, out=velocity, where=bounced)
+        np.greater(position, last, out=bounced)
+        np.subtract(2 * last, position, out=position, where=bounced)
+        np.multiply(velocity, -0.5, out=velocity, where=bounced)
+        np.clip(position, 0, last, out=position)
+
+        np.subtract(self.life, 1, out=self.life, where=self.alive)
+        np.greater(self.life, 0, out=self.alive)
+        # Mixed types would make numpy convert through a temporary
+        np.copyto(self.rounded, self.alive)
+        np.multiply(velocity, self.rounded, out=velocity)
+        self.live = int(np.count_nonzero(self.alive))
+        if not self.live:
+            self.end = 0
+
+    def draw(self):
+        if not self.live:
+            return
+        end = self.end
+        index = self.index[:end]
+        rounded = self.rounded[:end]
+        np.rint(self.position[:end], out=rounded)
+        np.copyto(index, rounded, casting="unsafe")
+        # Dead particles have no life left, so they add nothing and do not need to be filtered out.
+        light = self.light[:, :end]
+        np.copyto(light, self.color[:end].T)
+        # Channel by channel, broadcasting over all three at once goes through a temporary
+        for row in light:
+            np.multiply(row, self.life[:end], out=row)
+            np.floor_divide(row, self.lifetime[:end], out=row)
+
+        if not hasattr(self.ledstring, "buffer"):
+            alive = self.alive[:end]
+            for position, (r, g, b) in zip(index[alive].tolist(), light.T[alive].tolist()):
+                led = self.ledstring[position]
+                led.rgb((min(led.r + r, 255), min(led.g + g, 255), min(led.b + b, 255)))
+            return
+
+        # One channel at a time the particles are summed up on their LEDs, then every particle reads back the sum on its
+        # LED, adds the framebuffer and writes it back saturated. Particles on the same LED write the same value.
+        accumulator = self.accumulator
+        sums = self.sums[:end]
+        wide = self.wide[:end]
+        pixels = self.pixels[:end]
+        values = self.values[:end]
+        framebuffer = self.ledstring.buffer.reshape(-1)
+        for channel in range(3):
+            np.add.at(accumulator, index, light[channel])
+            np.take(accumulator, index, out=sums, mode="clip")
+            accumulator.fill(0)
+            np.multiply(index, 3, out=pixels)
+            np.add(pixels, channel, out=pixels)
+            np.take(framebuffer, pixels, out=values, mode="clip")
+            # Mixed types would make numpy convert through a temporary
+            np.copyto(wide, values)
+            np.add(sums, wide, out=sums)
+            np.minimum(sums, 255, out=sums)
+            np.copyto(values, sums, casting="unsafe")
+            framebuffer[pixels] = values
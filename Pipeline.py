@@ -0,0 +1,170 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import threading
+import time as systime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Hands finished frames from the simulation thread to the thread that renders and outputs them, without copying. The
+# ArrayLEDString draws into one of a small set of framebuffers, the back buffer. Once a frame is done publish makes it
+# the ready frame and swaps a free buffer in as the new back buffer. The render thread picks up the ready frame with
+# acquire and hands its buffer back with release once it has been shown.
+#
+# When the output falls behind there are two policies. "drop" throws away the ready frame nobody picked up and reuses
+# its buffer, the renderer always gets the newest frame and the simulation never waits. With only two buffers there is
+# no buffer to swap in while the renderer holds the other one, then the finished frame itself is dropped and the next
+# one gets drawn over it. "block" makes the simulation wait until the renderer has caught up, every frame is shown but a
+# slow output slows the game down.
+#
+# The game redraws everything every frame, effects that build on the previous frame like the fading screensavers need
+# persistent, which copies the finished frame into the new back buffer.
+#
+# Both threads report when they are working with begin and end, the time they were both at it is the overlap gained
+# over running everything on one thread. numpy, pygame, sockets and serial ports let go of the GIL while they work, so
+# that is real parallel work and not just interleaving.
+class FramePipeline:
+
+    def __init__(self, ledstring, buffers=3, policy="drop", persistent=False):
+        if np is None:
+            raise ImportError("FramePipeline requires numpy.")
+        if policy not in ("drop", "block"):
+            raise ValueError("policy has to be drop or block")
+        if buffers < 2:
+            raise ValueError("a pipeline needs at least two buffers")
+        self.ledstring = ledstring
+        self.policy = policy
+        self.persistent = persistent
+        self.free = [np.zeros_like(ledstring.buffer) for _ in range(buffers - 1)]
+        # The finished frame waiting for the renderer and the one the renderer holds, as (buffer, time, info).
+        self.ready = None
+        self.front = None
+        self.closed = False
+        self.condition = threading.Condition()
+        self.published = 0
+        self.rendered = 0
+        self.dropped = 0
+        self.blocked = 0.0
+        # Working time per side, how many sides are working right now and since when.
+        self.busy = {}
+        self.started = {}
+        self.overlap = 0.0
+        self.working = 0
+        self.since = None
+        self.first = None
+
+    # Called by the simulation once the LED string holds a finished frame. info goes along with the frame, like the
+    # values for a status bar.
+    def publish(self, time, info=None):
+        with self.condition:
+            if self.ready is not None:
+                if self.policy == "block":
+                    self.__wait(lambda: self.ready is None)
+                else:
+                    self.free.append(self.ready[0])
+                    self.ready = None
+                    self.dropped += 1
+            if not self.free and self.policy == "block":
+                self.__wait(lambda: self.free)
+            if self.closed:
+                return
+            if not self.free:
+                self.dropped += 1
+                return
+            back = self.ledstring.buffer
+            buffer = self.free.pop()
+            if self.persistent:
+                np.copyto(buffer, back)
+            self.ledstring.set_buffer(buffer)
+            self.ready = (back, time, info)
+            self.published += 1
+            self.condition.notify_all()
+
+    def __wait(self, predicate):
+        start = systime.perf_counter()
+        self.condition.wait_for(lambda: self.closed or predicate())
+        self.blocked += systime.perf_counter() - start
+
+    # Called by the renderer, returns the newest finished frame as (buffer, time, info), or None when the timeout ran
+    # out or the pipeline got closed and everything was shown. The buffer stays valid until release.
+    def acquire(self, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.closed or self.ready is not None, timeout):
+                return None
+            if self.ready is None:
+                return None
+            self.front = self.ready
+            self.ready = None
+            return self.front
+
+    # Time of the frame the renderer holds, a FrameRecorder on the output side can use the pipeline as its clock.
+    @property
+    def frame_time(self):
+        return self.front[1] if self.front is not None else 0
+
+    def release(self):
+        with self.condition:
+            if self.front is not None:
+                self.free.append(self.front[0])
+                self.front = None
+                self.rendered += 1
+                self.condition.notify_all()
+
+    # No more frames are coming, wakes up everyone waiting. A frame that is ready still gets handed out.
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def begin(self, side):
+        self.__switch(side, True)
+
+    def end(self, side):
+        self.__switch(side, False)
+
+    def __switch(self, side, working):
+        now = systime.perf_counter()
+        with self.condition:
+            if self.first is None:
+                self.first = now
+            if self.working == 2:
+                self.overlap += now - self.since
+            if working:
+                self.started[side] = now
+                self.working += 1
+            else:
+                self.busy[side] = self.busy.get(side, 0.0) + now - self.started[side]
+                self.working -= 1
+            self.since = now
+
+    def stats(self):
+        elapsed = systime.perf_counter() - self.first if self.first is not None else 0.0
+        stats = {"published": self.published, "rendered": self.rendered, "dropped": self.dropped,
+                 "blocked": "{:.3f}s".format(self.blocked)}
+        for side, busy in sorted(self.busy.items()):
+            stats[side] = "{:.0%}".format(busy / elapsed if elapsed else 0.0)
+        stats["overlap"] = "{:.0%}".format(self.overlap / elapsed if elapsed else 0.0)
+        return stats
@@ -23,8 +23,16 @@
 import utils
 
 
+# Constant colors, so that drawing a frame does not have to build new tuples.
+BODY = (0, 255, 0)
+FLASH = (255, 255, 255)
+
+
 class Player:
 
+    __slots__ = ("position", "ledstring", "direction", "attack_width", "attacking", "attack_millis", "attack_duration",
+                 "speed", "world")
+
     def __init__(self, ledstring, world, direction=1, attack_width=8, attack_duration=500):
         self.position = 0
         self.ledstring = ledstring
@@ -39,30 +47,45 @@ class Player:
 
     def draw(self, time):
         if not self.attacking:
-            self.ledstring[self.position].rgb((0, 255, 0))
+            self.ledstring[self.position] = BODY
         else:
             self.__draw_attack(time)
 
     def __draw_attack(self, time):
+        ledstring = self.ledstring
+        reach = self.attack_width // 2
         n = utils.range_map(time - self.attack_millis, 0, self.attack_duration, 100, 5)
-        for i in range(self.position - (self.attack_width // 2) + 1, self.position + (self.attack_width // 2) - 1):
-            self.ledstring[i].rgb((0, 0, n))
+        color = (0, 0, n)
+        # The attack is cut off at the ends of the string, the edges only show when they are on it.
+        last = len(ledstring) - 1
+        i = utils.range_constrain(self.position - reach + 1, 0, last)
+        end = utils.range_constrain(self.position + reach - 1, 0, last)
+        while i < end:
+            ledstring[i] = color
+            i += 1
         if n > 90:
-            n = 255
-            self.ledstring[self.position].rgb((255, 255, 255))
+            edge = FLASH
+            ledstring[self.position] = FLASH
         else:
-            n = 0
-            self.ledstring[self.position].rgb((0, 255, 0))
-        self.ledstring[self.position - (self.attack_width // 2)].rgb((n, n, 255))
-        self.ledstring[self.position + (self.attack_width // 2)].rgb((n, n, 255))
+            edge = (0, 0, 255)
+            ledstring[self.position] = BODY
+        if self.position - reach >= 0:
+            ledstring[self.position - reach] = edge
+        if self.position + reach <= last:
+            ledstring[self.position + reach] = edge
 
     def tick(self, time):
+        # Standing still while attacking, conveyors keep moving the player though.
+        amount = 0
         if self.attacking:
             if self.attack_millis + self.attack_duration < time:
                 self.attacking = False
+        else:
+            amount = self.speed * self.direction
+        hazards = self.world.get("hazards")
+        if hazards is not None:
+            self.position = hazards.move(self.position, amount)
             return
-
-        amount = self.speed * self.direction
         self.position += amount
         if self.position < 0:
             self.position = 0
@@ -70,14 +93,26 @@ class Player:
             self.position = len(self.ledstring) - 1
 
     def collide(self):
-        for enemy in self.world["enemies"]:
+        hazards = self.world.get("hazards")
+        if hazards is not None and hazards.hot(self.position):
+            self.die()
+            return
+        pool = self.world.get("enemy_pool")
+        if pool is not None and pool.player_contact(self.position):
+            self.die()
+            return
+        for enemy in self.world.get("enemies", ()):
             if not enemy.alive:
                 continue
             if ((enemy.player_side == 1) and (self.position >= enemy.position)) or \
                ((enemy.player_side == -1) and (self.position <= enemy.position)):
                 self.die()
+                return
 
     def die(self):
+        particles = self.world.get("particles")
+        if particles is not None:
+            particles.burst(self.position, 200, (0, 255, 0), speed=6.0, life=60)
         self.position = 0
 
     def attack(self, time):
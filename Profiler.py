@@ -0,0 +1,91 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import time as systime
+
+
+# Measures how long each stage of the main loop takes. A frame starts with begin, every lap books the time since the
+# previous lap (or begin) onto a stage, and end closes the frame. The last size frames are kept in a ring buffer to
+# report min/avg/p99 per stage, and frames where the work took longer than the budget are counted as missed.
+class FrameProfiler:
+
+    def __init__(self, stages, size=300, budget=1 / 60):
+        self.stages = stages
+        self.size = size
+        self.budget = budget
+        self.samples = {stage: [0.0] * size for stage in stages}
+        self.totals = [0.0] * size
+        self.frames = 0
+        self.missed = 0
+        self.start = 0.0
+        self.last = 0.0
+
+    def begin(self):
+        self.start = self.last = systime.perf_counter()
+        slot = self.frames % self.size
+        for samples in self.samples.values():
+            samples[slot] = 0.0
+
+    def lap(self, stage):
+        now = systime.perf_counter()
+        self.samples[stage][self.frames % self.size] += now - self.last
+        self.last = now
+
+    def end(self):
+        total = self.last - self.start
+        self.totals[self.frames % self.size] = total
+        if total > self.budget:
+            self.missed += 1
+        self.frames += 1
+
+    # Returns min, avg and p99 in seconds over the frames in the ring buffer for a stage, or the whole frame if None.
+    def stats(self, stage=None):
+        count = min(self.frames, self.size)
+        if not count:
+            return 0.0, 0.0, 0.0
+        samples = self.totals if stage is None else self.samples[stage]
+        samples = sorted(samples[:count])
+        return samples[0], sum(samples) / count, samples[min(count - 1, (count * 99) // 100)]
+
+    def summary(self):
+        parts = []
+        for stage in self.stages:
+            parts.append("{} {:.1f}/{:.1f}/{:.1f}".format(stage, *(s * 1000 for s in self.stats(stage))))
+        parts.append("frame {:.1f}/{:.1f}/{:.1f}ms".format(*(s * 1000 for s in self.stats())))
+        parts.append("missed {}/{}".format(self.missed, self.frames))
+        return " ".join(parts)
+
+
+# Stand in when profiling is turned off, so the main loop does not have to check for it all the time.
+class NullProfiler:
+
+    def begin(self):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def end(self):
+        pass
+
+    def summary(self):
+        return ""
@@ -0,0 +1,197 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pygame
+from FrameSink import FrameSink
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Lookup table doing the same gamma correction as pygame.Color.correct_gamma(0.5) on a single 8bit channel.
+if np is not None:
+    _gamma_table = np.array([pygame.Color(i, i, i).correct_gamma(0.5).r for i in range(256)], dtype=np.uint8)
+    # The table skips a lot of the dark values, so colors using those can serve as colorkeys when drawing.
+    _gamma_unused = sorted(set(range(256)) - set(_gamma_table.tolist()))
+    _gamma_margin_key = (_gamma_unused[0], 0, 0)
+    _gamma_led_key = (_gamma_unused[1], 0, 0)
+
+
+# Shows the LED string as squares in a pygame window with a status bar below it. Strings that do not fit into max_width
+# pixels (by default the width of the display) are wrapped into several rows.
+class PygameSink(FrameSink):
+
+    def __init__(self, length, size=13, margin=1, status_height=13, caption="pyTWANG", background=(128, 128, 128),
+                 max_width=None):
+        self.length = length
+        self.size = size
+        self.margin = margin
+        self.status_height = status_height
+        self.caption = caption
+        self.background = background
+        self.max_width = max_width
+        self.columns = length
+        self.rows = 1
+        self.work_rect = pygame.Rect(margin, margin, size - margin * 2, size - margin * 2)
+        self.screen = None
+        self.font = None
+        self.pixels = None
+        self.status_text = ""
+        self.status_shown = None
+        self.dirty_rects = []
+        # Copy of what was last drawn, used to find the LEDs that need to be redrawn.
+        self.shown = None
+        self.shown_valid = False
+        self.dirty_merge = 4
+        self.dirty_max_runs = 32
+
+    def open(self):
+        pygame.init()
+        max_width = self.max_width
+        if max_width is None:
+            max_width = pygame.display.Info().current_w or 1800
+        self.columns = max(1, min(self.length, max_width // self.size))
+        self.rows = -(-self.length // self.columns)
+        self.screen = pygame.display.set_mode((self.size * self.columns, self.size * self.rows + self.status_height))
+        pygame.display.set_caption(self.caption)
+        self.font = pygame.font.Font(None, 20)
+        self.invalidate()
+
+    def close(self):
+        pygame.quit()
+
+    def set_status(self, text):
+        self.status_text = text
+
+    # Forget what is on the screen, the next frame will repaint the whole window.
+    def invalidate(self):
+        self.screen.fill(self.background)
+        pygame.display.flip()
+        self.shown_valid = False
+        self.status_shown = None
+
+    def show(self, frame):
+        self.render(frame)
+        self.present()
+
+    # Showing a frame is split into drawing it onto the window surface and pushing the changed areas to the display,
+    # so that the two can be timed separately.
+    def render(self, frame):
+        if np is not None and isinstance(frame, np.ndarray):
+            dirty_rects = self.__draw_array(frame)
+        else:
+            dirty_rects = self.__draw_list(frame)
+
+        # Draw satusbar information, only when it changed
+        if self.status_text != self.status_shown:
+            self.status_shown = self.status_text
+            status_top = self.size * self.rows
+            status_area = pygame.Rect(0, status_top, self.screen.get_width(), self.status_height)
+            self.screen.fill(self.background, status_area)
+            status = self.font.render(self.status_text, True, (0, 0, 0))
+            status_rect = status.get_rect()
+            status_rect.topleft = (10, status_top)
+            self.screen.blit(status, status_rect)
+            dirty_rects.append(status_area)
+        self.dirty_rects = dirty_rects
+
+    def present(self):
+        # Make the changed areas visible
+        pygame.display.update(self.dirty_rects)
+        self.dirty_rects = []
+
+    # Per LED drawing for the list backed LEDString.
+    def __draw_list(self, frame):
+        color = pygame.Color(0, 0, 0)
+        for i, (r, g, b) in enumerate(frame):
+            self.work_rect.x = self.margin + (i % self.columns) * self.size
+            self.work_rect.y = self.margin + (i // self.columns) * self.size
+            color.r = r
+            color.g = g
+            color.b = b
+            pygame.draw.rect(self.screen, color.correct_gamma(0.5), self.work_rect)
+        return [pygame.Rect(self.margin, self.margin, self.columns * self.size, self.rows * self.size)]
+
+    def __draw_array(self, frame):
+        if self.pixels is None:
+            self.__create_surfaces()
+
+        # Gamma correct the whole framebuffer through the lookup table into the 1 pixel per LED surface, one line per
+        # row, and blow that up to the LED size. The margins are then stamped back in with a color the gamma table never
+        # produces, which is the colorkey of the scaled surface, so that they are left untouched on the screen.
+        self.padded[:self.length] = _gamma_table[frame]
+        pygame.surfarray.pixels3d(self.pixels)[:] = self.padded.reshape(self.rows, self.columns, 3).transpose(1, 0, 2)
+
+        # Only the runs of LEDs that changed since the last frame are scaled and blitted. Runs that are only a few LEDs
+        # apart are merged, and if there are too many of them we just redraw the whole string.
+        if not self.shown_valid:
+            runs = None
+        else:
+            changed = np.flatnonzero((frame != self.shown).any(axis=1))
+            if not len(changed):
+                return []
+            breaks = np.flatnonzero(np.diff(changed) > self.dirty_merge) + 1
+            if len(breaks) + 1 + len(changed) // self.columns > self.dirty_max_runs:
+                runs = None
+            else:
+                runs = zip(changed[np.r_[0, breaks]].tolist(), (changed[np.r_[breaks - 1, -1]] + 1).tolist())
+        np.copyto(self.shown, frame)
+        self.shown_valid = True
+
+        if runs is None:
+            areas = (pygame.Rect((0, 0), self.scaled.get_size()),)
+        else:
+            areas = []
+            for start, end in runs:
+                # Runs that wrap around into the next row become one area per row.
+                while start < end:
+                    row, column = divmod(start, self.columns)
+                    count = min(end - start, self.columns - column)
+                    areas.append(pygame.Rect(column * self.size, row * self.size, count * self.size, self.size))
+                    start += count
+
+        rects = []
+        x, y = self.work_rect.topleft
+        for area in areas:
+            pixels = pygame.Rect(area.x // self.size, area.y // self.size, area.w // self.size, area.h // self.size)
+            pygame.transform.scale(self.pixels.subsurface(pixels), area.size, self.scaled.subsurface(area))
+            self.scaled.blit(self.margins, area, area)
+            rects.append(self.screen.blit(self.scaled, (x + area.x, y + area.y), area))
+        return rects
+
+    def __create_surfaces(self):
+        self.pixels = pygame.Surface((self.columns, self.rows))
+        self.padded = np.zeros((self.rows * self.columns, 3), dtype=np.uint8)
+        self.shown = np.empty((self.length, 3), dtype=np.uint8)
+        self.scaled = pygame.Surface((self.columns * self.size, self.rows * self.size))
+        self.scaled.set_colorkey(_gamma_margin_key)
+
+        # Margin key colored between the LEDs and transparent where the LEDs are.
+        self.margins = pygame.Surface(self.scaled.get_size())
+        self.margins.fill(_gamma_margin_key)
+        cell = pygame.Rect(0, 0, self.work_rect.width, self.work_rect.height)
+        for i in range(self.length):
+            cell.topleft = ((i % self.columns) * self.size, (i // self.columns) * self.size)
+            self.margins.fill(_gamma_led_key, cell)
+        self.margins.set_colorkey(_gamma_led_key, pygame.RLEACCEL)
@@ -0,0 +1,219 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Records the frames sent to the LEDs into a file and plays them back.
+#
+# The file is a 16 byte header followed by fixed size records, each a little endian 32bit timestamp in milliseconds and
+# the raw 8bit RGB framebuffer. Fixed size records mean any frame can be found without reading the ones before it, so
+# the player just maps the file into memory and hands out views into it.
+
+import mmap
+import struct
+import sys
+import time as systime
+
+from FrameSink import FrameSink
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAGIC = b"TWFR"
+VERSION = 1
+# magic, version, LED count, reserved
+HEADER = struct.Struct("<4sHIxxxxxx")
+TIMESTAMP = struct.Struct("<I")
+
+
+# Appends every frame it is shown to a file. The timestamps are taken from clock.frame_time, the simulation time of the
+# step the frame was drawn in, so that recordings do not depend on how fast they were made, or count frames if there is
+# no clock.
+class FrameRecorder(FrameSink):
+
+    def __init__(self, path, length, clock=None):
+        self.path = path
+        self.length = length
+        self.clock = clock
+        self.file = None
+        self.frames = 0
+
+    def open(self):
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.length))
+        self.frames = 0
+
+    def show(self, frame):
+        time = self.clock.frame_time if self.clock is not None else self.frames
+        self.file.write(TIMESTAMP.pack(time & 0xFFFFFFFF))
+        if np is not None and isinstance(frame, np.ndarray):
+            if frame.shape != (self.length, 3):
+                raise ValueError("frame has to be {} LEDs".format(self.length))
+            self.file.write(np.ascontiguousarray(frame, dtype=np.uint8).data)
+        else:
+            frame = bytes(channel for color in frame for channel in color)
+            if len(frame) != self.length * 3:
+                raise ValueError("frame has to be {} LEDs".format(self.length))
+            self.file.write(frame)
+        self.frames += 1
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def stats(self):
+        return {"recorded": self.frames}
+
+
+class FramePlayer:
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as file:
+            header = file.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise ValueError("{} is not a frame recording".format(path))
+            magic, version, self.length = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{} is not a version {} frame recording".format(path, VERSION))
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.record_size = TIMESTAMP.size + self.length * 3
+        # A recording that was cut short ends with a partial record, which is ignored.
+        self.frames = (len(self.map) - HEADER.size) // self.record_size
+        if np is not None:
+            records = np.frombuffer(self.map, dtype=np.dtype([("time", "<u4"), ("frame", np.uint8, (self.length, 3))]),
+                                    count=self.frames, offset=HEADER.size)
+            self.times = records["time"]
+            self.buffers = records["frame"]
+
+    def __len__(self):
+        return self.frames
+
+    # Frames handed out earlier keep the mapping alive until they are gone, only then can it be closed right away.
+    def close(self):
+        self.times = self.buffers = None
+        try:
+            self.map.close()
+        except BufferError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def time(self, index):
+        return TIMESTAMP.unpack_from(self.map, HEADER.size + index * self.record_size)[0]
+
+    # The frame at index, a read only view into the file with numpy and a list of tuples without it.
+    def frame(self, index):
+        if not -self.frames <= index < self.frames:
+            raise IndexError("frame index out of range")
+        index %= self.frames
+        if np is not None:
+            return self.buffers[index]
+        start = HEADER.size + index * self.record_size + TIMESTAMP.size
+        data = self.map[start:start + self.length * 3]
+        return [tuple(data[i:i + 3]) for i in range(0, len(data), 3)]
+
+    # Index of the first frame recorded at or after time.
+    def seek(self, time):
+        if np is not None:
+            return int(np.searchsorted(self.times, time))
+        low, high = 0, self.frames
+        while low < high:
+            middle = (low + high) // 2
+            if self.time(middle) < time:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    # Streams frames start to stop into sink, as fast as the sink takes them, or paced by the recorded timestamps
+    # divided by speed when realtime is set.
+    def play(self, sink, start=0, stop=None, realtime=False, speed=1):
+        stop = self.frames if stop is None else min(stop, self.frames)
+        starttime = systime.perf_counter()
+        for index in range(start, stop):
+            if realtime:
+                delay = (self.time(index) - self.time(start)) / 1000 / speed - (systime.perf_counter() - starttime)
+                if delay > 0:
+                    systime.sleep(delay)
+            sink.show(self.frame(index))
+        return stop - start
+
+    # Index of the first frame that differs from the other recording, None if they are the same. Recordings of different
+    # lengths differ at the end of the shorter one.
+    def compare(self, other, chunk=1024):
+        if other.length != self.length:
+            return 0
+        frames = min(self.frames, other.frames)
+        if np is not None:
+            for start in range(0, frames, chunk):
+                stop = min(start + chunk, frames)
+                differs = (self.buffers[start:stop] != other.buffers[start:stop]).reshape(stop - start, -1).any(axis=1)
+                differs |= self.times[start:stop] != other.times[start:stop]
+                if differs.any():
+                    return start + int(np.argmax(differs))
+        else:
+            for index in range(frames):
+                start = HEADER.size + index * self.record_size
+                if self.map[start:start + self.record_size] != other.map[start:start + self.record_size]:
+                    return index
+        return None if self.frames == other.frames else frames
+
+
+if __name__ == "__main__":
+    import argparse
+    import FrameSink
+
+    parser = argparse.ArgumentParser(description="Frame recordings")
+    parser.add_argument("command", choices=("info", "play", "compare"))
+    parser.add_argument("recording")
+    parser.add_argument("other", nargs="?", help="second recording for compare")
+    parser.add_argument("--realtime", action="store_true", help="play at the recorded speed")
+    args = parser.parse_args()
+
+    with FramePlayer(args.recording) as player:
+        if args.command == "info":
+            duration = player.time(len(player) - 1) - player.time(0) if len(player) else 0
+            print("{} frames of {} LEDs, {:.1f}s".format(len(player), player.length, duration / 1000))
+        elif args.command == "play":
+            sink = FrameSink.NullSink()
+            starttime = systime.perf_counter()
+            player.play(sink, realtime=args.realtime)
+            elapsed = systime.perf_counter() - starttime
+            print("{} frames in {:.3f}s, {:.1f} frames/s".format(sink.frames, elapsed,
+                                                              sink.frames / elapsed if elapsed else float("inf")))
+        else:
+            if args.other is None:
+                parser.error("compare needs two recordings")
+            with FramePlayer(args.other) as other:
+                index = player.compare(other)
+            if index is None:
+                print("recordings are identical")
+            else:
+                print("recordings differ at frame {}".format(index))
+                sys.exit(1)
+    sys.exit(0)
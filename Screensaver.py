@@ -21,8 +21,14 @@
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 import random
-import math
 import LEDString
+import Palette
+import lib8tion
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class Screensaver:
@@ -30,26 +36,34 @@ class Screensaver:
     # these are dots in bowl parameters
     dotspeed = 22
     dots_in_bowls_count = 3
-    dot_distance = 65535 / dots_in_bowls_count
+    dot_distance = 65535 // dots_in_bowls_count
     dot_brightness = 255
 
-    def __init__(self, ledstring):
+    def __init__(self, ledstring, seed=None):
         self.ledstring = ledstring
+        # FastLED's random8 like the Arduino version, seeded from the seed.
+        self.random = lib8tion.Random(random.Random(seed).getrandbits(16))
+        if np is not None:
+            self.headroom = np.zeros((5, 3), dtype=np.uint8)
+            self.mask = np.zeros((len(ledstring), 1), dtype=bool)
 
     def tick(self, time):
         mode = int(time / 3000) % 5
         # mode = 4
         ledstring = self.ledstring
 
+        if isinstance(ledstring, LEDString.ArrayLEDString):
+            self.__tick_array(mode, time)
+            return
+
         # print(f"m: {mode}")
         if mode == 0:
             # Marching green <> orange
             for led in ledstring:
                 led.nscale8(250)
 
-            n = int((time / 250) % 10)
-            c = int(20 + ((math.sin(math.radians(time / 5000.00)) * 255 + 1) * 33)) % 256
-            # print(f"t: {time / 5000.00} c: {c}")
+            n = (time // 250) % 10
+            c = _marching_hue(time)
             for i in range(len(ledstring)):
                 if i % 10 == n:
                     result = ledstring[i].nhsv_rainbow(c, 255, 150)
@@ -61,7 +75,7 @@ class Screensaver:
                 led.nscale8(250)
 
             for i in range(len(ledstring)):
-                if random.randrange(0, 20) == 0:
+                if self.random.random8(20) == 0:
                     ledstring[i].nhsv_rainbow(25, 255, 100)
 
         elif mode == 2:
@@ -69,10 +83,7 @@ class Screensaver:
             ledstring.clear()
 
             for i in range(Screensaver.dots_in_bowls_count):
-                mm = (((i * Screensaver.dot_distance) + (time % (2 ** 32)) * Screensaver.dotspeed) % (2 ** 16)) / (2 ** 15)
-                n = int((((math.sin(mm * math.pi) + 1) / 2) * (len(ledstring) - 5)) + 2)
-                c = int(mm * 128)
-                # print(f"mm {mm} n {n} c {c}")
+                n, c = _dot(i, time, len(ledstring))
                 ledstring[n - 2] += LEDString.hsv_rainbow(c, 255, Screensaver.dot_brightness // 4)
                 ledstring[n - 1] += LEDString.hsv_rainbow(c, 255, Screensaver.dot_brightness // 2)
                 ledstring[n + 0] += LEDString.hsv_rainbow(c, 255, Screensaver.dot_brightness)
@@ -91,7 +102,7 @@ class Screensaver:
                 n = 1
 
             for i in range(len(ledstring)):
-                if random.randrange(0, 256) <= n:
+                if self.random.random8() <= n:
                     ledstring[i].rgb((100, 100, 100))
 
         else:
@@ -101,3 +112,94 @@ class Screensaver:
                     ledstring[i].rgb((100, 100, 100))
                 else:
                     ledstring[i].rgb((0, 0, 0))
+
+    # Vectorized version of the modes above for the array backed LED string. It renders exactly the same frames as the
+    # per LED code for the same time and seed, it just works on the whole framebuffer at once.
+    def __tick_array(self, mode, time):
+        ledstring = self.ledstring
+        buffer = ledstring.buffer
+
+        if mode == 0:
+            # Marching green <> orange
+            ledstring.nscale8(250)
+
+            n = (time // 250) % 10
+            c = _marching_hue(time)
+            buffer[n::10] = LEDString.hsv_rainbow(c, 255, 150)
+
+        elif mode == 1:
+            # Random flashes
+            ledstring.nscale8(250)
+
+            flashes = self.mask
+            np.equal(self.random.random8_array(len(buffer), 20), 0, out=flashes[:, 0])
+            np.copyto(buffer, _flash, where=flashes)
+
+        elif mode == 2:
+            # dots in bowl
+            buffer.fill(0)
+
+            # Each dot is five LEDs wide and fades out towards its sides. Overlapping dots add up saturating at 255 the
+            # same way LED.__add__ does, a + b saturates as a + min(b, 255 - a). There are only a few dots, so they are
+            # added one by one.
+            headroom = self.headroom
+            tables = _dot_colors()
+            for i in range(Screensaver.dots_in_bowls_count):
+                n, c = _dot(i, time, len(buffer))
+                dot = buffer[n - 2:n + 3]
+                np.subtract(255, dot, out=headroom)
+                np.minimum(headroom, tables[c], out=headroom)
+                np.add(dot, headroom, out=dot)
+
+        elif mode == 3:
+            # Sparkles
+            ledstring.nscale8(128)
+
+            c = time % 800
+            if c < 240:
+                n = 121 - c // 2
+            else:
+                n = 1
+
+            sparkles = self.mask
+            np.less_equal(self.random.random8_array(len(buffer)), n, out=sparkles[:, 0])
+            np.copyto(buffer, _sparkle, where=sparkles)
+
+        else:
+            # Scroll dots
+            buffer.fill(0)
+            buffer[(-(time // 100)) % 5::5] = (100, 100, 100)
+
+
+# Hue of the marching dots, swinging between green and orange once every 2 pi * 5 seconds. That is sin(time / 5000)
+# with the time turned into a 16 bit angle for sin16 as 16.16 fixed point: 65536 / (2 pi 5000) * 65536.
+def _marching_hue(time):
+    return 20 + (((lib8tion.sin16((time * 136713) >> 16) + 32768) * 66) >> 16)
+
+
+# Position and hue of dot i, ints or arrays. The dots go around a 16 bit circle dotspeed steps every millisecond, their
+# position along the string follows the sine of that, the hue the angle itself.
+def _dot(i, time, length):
+    angle = (i * Screensaver.dot_distance + time * Screensaver.dotspeed) & 0xFFFF
+    return (((lib8tion.sin16(angle) + 32768) * (length - 5)) >> 16) + 2, angle >> 8
+
+
+# Colors of the flashes and sparkles, as arrays so that copying them into the framebuffer does not convert them every
+# frame.
+if np is not None:
+    _flash = np.array(LEDString.hsv_rainbow(25, 255, 100), dtype=np.uint8)
+    _sparkle = np.array((100, 100, 100), dtype=np.uint8)
+
+
+# Rainbow color tables for the five LEDs of a dot, from dim at the sides to the full dot brightness in the middle, as
+# the colors of all five for each hue.
+_dot_tables = None
+
+
+def _dot_colors():
+    global _dot_tables
+    if _dot_tables is None:
+        brightness = Screensaver.dot_brightness
+        falloff = (brightness // 4, brightness // 2, brightness, brightness // 2, brightness // 4)
+        _dot_tables = np.stack([Palette.rainbow_palette(255, v).table for v in falloff], axis=1)
+    return _dot_tables
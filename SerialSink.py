@@ -0,0 +1,370 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Serial output for microcontroller driven LED strips, in the spirit of Adalight but compressed.
+#
+# A plain Adalight frame is "Ada", the LED count and a checksum, followed by 3 bytes for every LED. On a slow serial
+# link that caps the frame rate, so by default we send one of three packet types instead and only ever pick the one
+# that comes out smallest:
+#
+#   raw keyframe  'K'  all LEDs, 3 bytes each
+#   rle keyframe  'R'  runs of equal LEDs, each run is (count - 1, r, g, b), so at most 256 LEDs per run
+#   delta frame   'D'  only the spans of LEDs that changed since the previous frame, each span is
+#                      (offset hi, offset lo, count hi, count lo) followed by count * 3 bytes
+#
+# Every packet looks like
+#
+#   'T' 'w' type sequence length_2 length_1 length_0 (length_2 ^ length_1 ^ length_0 ^ 0x55) payload checksum
+#
+# where the payload length is 24 bits, most significant byte first, and checksum is the sum of the payload bytes modulo
+# 256. The sequence counts up by one with every packet, so that a receiver notices a lost one. Every keyframe_interval
+# frames a keyframe is forced, so that a receiver that lost a packet gets back in sync. SerialDecoder is the reference
+# implementation of the receiving side.
+#
+# Span offsets and counts are 16 bits, so a serial output drives at most MAX_LEDS LEDs. Longer installations are split
+# over several outputs with a layout.
+
+import os
+import sys
+
+import numpy as np
+
+from FrameSink import FrameSink
+
+try:
+    import serial
+except ImportError:
+    serial = None
+
+MAGIC = b"Tw"
+RAW_KEYFRAME = ord("K")
+RLE_KEYFRAME = ord("R")
+DELTA = ord("D")
+HEADER_SIZE = 8
+MAX_LEDS = 65535
+
+# Gaps between changed spans shorter than this are sent along, that is cheaper than the header of a new span.
+DELTA_MERGE_GAP = 1
+
+
+def adalight_size(length):
+    return 6 + length * 3
+
+
+def adalight_frame(frame):
+    count = len(frame) - 1
+    hi, lo = count >> 8, count & 0xFF
+    return bytes((ord("A"), ord("d"), ord("a"), hi, lo, hi ^ lo ^ 0x55)) + np.ascontiguousarray(frame).tobytes()
+
+
+def _packet(kind, sequence, payload):
+    length = len(payload)
+    b2, b1, b0 = length >> 16, (length >> 8) & 0xFF, length & 0xFF
+    checksum = int(np.frombuffer(payload, dtype=np.uint8).sum()) & 0xFF if length else 0
+    return MAGIC + bytes((kind, sequence, b2, b1, b0, b2 ^ b1 ^ b0 ^ 0x55)) + payload + bytes((checksum,))
+
+
+# Turns frames into the packets described above. The encoder remembers the last frame it sent, which is what the
+# decoder on the other end has on its strip as well.
+class FrameEncoder:
+
+    def __init__(self, length, keyframe_interval=60):
+        if length > MAX_LEDS:
+            raise ValueError("a serial output drives at most {} LEDs, not {}".format(MAX_LEDS, length))
+        self.length = length
+        self.keyframe_interval = keyframe_interval
+        self.previous = np.zeros((length, 3), dtype=np.uint8)
+        self.sequence = 0
+        self.frames = 0
+        self.counts = {RAW_KEYFRAME: 0, RLE_KEYFRAME: 0, DELTA: 0}
+
+    def encode(self, frame):
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        keyframe = self.frames % self.keyframe_interval == 0
+
+        candidates = [(RLE_KEYFRAME, rle_encode(frame))]
+        if keyframe:
+            candidates.append((RAW_KEYFRAME, frame.tobytes()))
+        else:
+            candidates.append((DELTA, delta_encode(self.previous, frame)))
+        kind, payload = min(candidates, key=lambda candidate: len(candidate[1]))
+
+        np.copyto(self.previous, frame)
+        self.frames += 1
+        self.counts[kind] += 1
+        self.sequence = (self.sequence + 1) % 256
+        return _packet(kind, self.sequence, payload)
+
+
+def rle_encode(frame):
+    colors = frame.astype(np.uint32)
+    keys = (colors[:, 0] << 16) | (colors[:, 1] << 8) | colors[:, 2]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    lengths = np.diff(np.r_[starts, len(keys)])
+
+    # Runs longer than 256 LEDs are split into several, all but the last of them 256 long.
+    pieces = (lengths + 255) // 256
+    first_pieces = np.repeat(np.cumsum(pieces) - pieces, pieces)
+    run_starts = np.repeat(starts, pieces) + 256 * (np.arange(pieces.sum()) - first_pieces)
+    run_lengths = np.minimum(np.repeat(starts + lengths, pieces) - run_starts, 256)
+
+    runs = np.empty((len(run_starts), 4), dtype=np.uint8)
+    runs[:, 0] = run_lengths - 1
+    runs[:, 1:] = frame[run_starts]
+    return runs.tobytes()
+
+
+def delta_encode(previous, frame):
+    changed = np.flatnonzero((previous != frame).any(axis=1))
+    if not len(changed):
+        return b""
+    breaks = np.flatnonzero(np.diff(changed) > DELTA_MERGE_GAP + 1) + 1
+    starts = changed[np.r_[0, breaks]]
+    ends = changed[np.r_[breaks - 1, -1]] + 1
+    lengths = ends - starts
+
+    # Every span is a 4 byte header followed by its pixels, block is where each span starts in the payload.
+    sizes = 4 + lengths * 3
+    block = np.cumsum(sizes) - sizes
+    payload = np.empty(int(sizes.sum()), dtype=np.uint8)
+    payload[block] = starts >> 8
+    payload[block + 1] = starts & 0xFF
+    payload[block + 2] = lengths >> 8
+    payload[block + 3] = lengths & 0xFF
+
+    pixels = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    destination = np.repeat(block + 4 - starts * 3, lengths) + pixels * 3
+    payload[destination[:, np.newaxis] + np.arange(3)] = frame[pixels]
+    return payload.tobytes()
+
+
+# Reference decoder for the packets above. Feed it the bytes as they come in from the serial line, it returns the list
+# of frames completed by them. Broken packets and packets that do not fit the strip are skipped. After one of those, or
+# when the sequence shows that packets went missing, deltas are ignored until the next keyframe.
+class SerialDecoder:
+
+    def __init__(self, length):
+        self.length = length
+        self.frame = np.zeros((length, 3), dtype=np.uint8)
+        self.pending = bytearray()
+        self.synced = False
+        self.sequence = None
+        self.errors = 0
+        self.gaps = 0
+
+    def feed(self, data):
+        self.pending += data
+        frames = []
+        while True:
+            start = self.pending.find(MAGIC)
+            if start < 0:
+                del self.pending[:-1]
+                return frames
+            del self.pending[:start]
+            if len(self.pending) < HEADER_SIZE:
+                return frames
+            kind, sequence, b2, b1, b0, check = self.pending[2:HEADER_SIZE]
+            if b2 ^ b1 ^ b0 ^ 0x55 != check or kind not in (RAW_KEYFRAME, RLE_KEYFRAME, DELTA):
+                self.__error()
+                del self.pending[:1]
+                continue
+            size = HEADER_SIZE + ((b2 << 16) | (b1 << 8) | b0) + 1
+            if len(self.pending) < size:
+                return frames
+            payload = bytes(self.pending[HEADER_SIZE:size - 1])
+            checksum = self.pending[size - 1]
+            del self.pending[:size]
+            if sum(payload) & 0xFF != checksum:
+                self.__error()
+                continue
+            if self.sequence is not None and sequence != (self.sequence + 1) % 256:
+                self.gaps += 1
+                self.synced = False
+            self.sequence = sequence
+            if self.__apply(kind, payload):
+                frames.append(self.frame.copy())
+
+    def __error(self):
+        self.errors += 1
+        self.synced = False
+
+    # Packets that do not add up to the strip are rejected as a whole, the strip is left as it was.
+    def __apply(self, kind, payload):
+        data = np.frombuffer(payload, dtype=np.uint8)
+        if kind == RAW_KEYFRAME:
+            if len(data) != self.length * 3:
+                return self.__reject()
+            self.frame[:] = data.reshape(-1, 3)
+        elif kind == RLE_KEYFRAME:
+            if len(data) % 4:
+                return self.__reject()
+            runs = data.reshape(-1, 4)
+            counts = runs[:, 0].astype(np.intp) + 1
+            if counts.sum() != self.length:
+                return self.__reject()
+            self.frame[:] = np.repeat(runs[:, 1:], counts, axis=0)
+        else:
+            if not self.synced:
+                return False
+            spans = []
+            position = 0
+            while position < len(data):
+                if position + 4 > len(data):
+                    return self.__reject()
+                start = (int(data[position]) << 8) | int(data[position + 1])
+                count = (int(data[position + 2]) << 8) | int(data[position + 3])
+                position += 4
+                if start + count > self.length or position + count * 3 > len(data):
+                    return self.__reject()
+                spans.append((start, count, position))
+                position += count * 3
+            for start, count, position in spans:
+                self.frame[start:start + count] = data[position:position + count * 3].reshape(-1, 3)
+        self.synced = True
+        return True
+
+    def __reject(self):
+        self.__error()
+        return False
+
+
+# Writes the frames to a serial port. The port can be a device path, opened through pyserial if it is available (or as a
+# plain file otherwise, which is good enough for pseudo terminals), or anything with a write method. With
+# protocol="adalight" plain uncompressed Adalight frames are sent instead.
+class SerialSink(FrameSink):
+
+    def __init__(self, port, length, baudrate=115200, keyframe_interval=60, protocol="delta"):
+        if protocol not in ("delta", "adalight"):
+            raise ValueError("protocol has to be delta or adalight")
+        self.port = port
+        self.length = length
+        self.baudrate = baudrate
+        self.protocol = protocol
+        self.encoder = FrameEncoder(length, keyframe_interval)
+        self.output = None
+        self.frames = 0
+        self.bytes = 0
+
+    def open(self):
+        if hasattr(self.port, "write"):
+            self.output = self.port
+        elif serial is not None:
+            self.output = serial.Serial(self.port, self.baudrate)
+        else:
+            self.output = open(self.port, "wb", buffering=0)
+            if self.output.isatty():
+                # No line discipline translating our bytes, that is what pyserial would do for us as well.
+                import tty
+                tty.setraw(self.output.fileno())
+
+    def close(self):
+        if self.output is not None and self.output is not self.port:
+            self.output.close()
+        self.output = None
+
+    def show(self, frame):
+        if self.protocol == "adalight":
+            data = adalight_frame(frame)
+        else:
+            data = self.encoder.encode(frame)
+        self.output.write(data)
+        self.frames += 1
+        self.bytes += len(data)
+
+    def stats(self):
+        raw = self.frames * adalight_size(self.length)
+        return {"frames": self.frames, "bytes": self.bytes, "adalight bytes": raw,
+                "saved": "{:.1%}".format(1 - self.bytes / raw) if raw else "-"}
+
+
+# Encodes frames of the screensaver modes and of gameplay, checks that they decode back to the same frames and prints
+# how many bytes per frame that took compared to plain Adalight.
+def report(length=144, seconds=3, fps=60):
+    import LEDString
+    import Screensaver
+    import Game
+
+    def measure(name, ledstring, tick, start):
+        encoder = FrameEncoder(length)
+        decoder = SerialDecoder(length)
+        total = 0
+        frames = seconds * fps
+        for n in range(frames):
+            tick(start + n * 1000 // fps)
+            packet = encoder.encode(ledstring.frame())
+            total += len(packet)
+            decoded = decoder.feed(packet)
+            if len(decoded) != 1 or not np.array_equal(decoded[0], ledstring.frame()):
+                raise AssertionError(f"{name}: frame {n} did not decode to the frame that was sent")
+        raw = adalight_size(length)
+        print(f"{name:30} {total / frames:8.1f} bytes/frame  adalight {raw} bytes/frame  "
+              f"saved {1 - total / (frames * raw):6.1%}")
+
+    for mode in range(5):
+        ledstring = LEDString.ArrayLEDString(length)
+        screensaver = Screensaver.Screensaver(ledstring, seed=0)
+        measure(f"screensaver mode {mode}", ledstring, screensaver.tick, mode * 3000)
+
+    ledstring = LEDString.ArrayLEDString(length)
+    game = Game.Game(ledstring)
+    game.player_speed = 1
+    measure("gameplay", ledstring, game.tick, 0)
+
+
+# Sends frames through a pseudo terminal pair and decodes them on the other end.
+def pty_check(length=144, frames=120):
+    import LEDString
+    import Screensaver
+
+    master, slave = os.openpty()
+    ledstring = LEDString.ArrayLEDString(length)
+    screensaver = Screensaver.Screensaver(ledstring, seed=0)
+    decoder = SerialDecoder(length)
+    received = 0
+    with SerialSink(os.ttyname(slave), length) as sink:
+        for n in range(frames):
+            screensaver.tick(n * 1000 // 60)
+            sink.show(ledstring.frame())
+            while True:
+                decoded = decoder.feed(os.read(master, 65536))
+                if decoded:
+                    break
+            if not np.array_equal(decoded[-1], ledstring.frame()):
+                raise AssertionError(f"frame {n} did not decode to the frame that was sent")
+            received += len(decoded)
+        print(f"{received} frames through {os.ttyname(slave)}, {sink.stats()}")
+    os.close(master)
+    os.close(slave)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compressed serial LED protocol")
+    parser.add_argument("--leds", type=int, default=144)
+    parser.add_argument("--pty", action="store_true", help="send frames through a pseudo terminal pair and decode them")
+    args = parser.parse_args()
+    if args.pty:
+        pty_check(args.leds)
+    else:
+        report(args.leds)
+    sys.exit(0)
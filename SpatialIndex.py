@@ -0,0 +1,186 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+
+
+# One dimensional index of entities sorted by their position on the LED string. Entities are identified by their slot
+# in some struct of arrays (EnemyPool, particles, ...), update takes the positions of all slots and a mask of the live
+# ones. The index keeps its order from one update to the next in preallocated buffers: dead entities are squeezed out,
+# new ones go to the end, and an insertion sort puts the few that moved past a neighbour back in place. Entities only
+# move a little every step, so that is close to linear and does not allocate anything in the steady state. Queries are
+# binary searches over the sorted positions.
+#
+# Slots past the end of the live mask are gone, so the mask can get shorter from one update to the next. clear forgets
+# all entities at once, for when the slots are handed out anew.
+#
+# Indices that are shared between different parts of the game are kept in the world, see index_for.
+class SpatialIndex:
+
+    # Past this many entities out of place a full sort is cheaper than inserting them one by one.
+    resort = 8
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        # Length of the live mask of the last update.
+        self.size = 0
+        self.__allocate(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def __allocate(self, capacity):
+        count = self.count
+        order = np.zeros(capacity, dtype=np.intp)
+        keys = np.zeros(capacity, dtype=np.int64)
+        if count:
+            order[:count] = self.order[:count]
+            keys[:count] = self.keys[:count]
+        self.order = order
+        self.keys = keys
+        self.kept = np.zeros(capacity, dtype=bool)
+        self.indexed = np.zeros(capacity, dtype=bool)
+        self.added = np.zeros(capacity, dtype=bool)
+        self.scratch = np.zeros(capacity, dtype=np.intp)
+        self.previous = np.zeros(capacity + 1, dtype=np.intp)
+        self.highest = np.zeros(capacity, dtype=np.int64)
+        self.places = np.arange(capacity, dtype=np.int64)
+        self.__views()
+
+    # The sorted ids and their positions, views into the buffers.
+    def __views(self):
+        self.ids = self.order[:self.count]
+        self.positions = self.keys[:self.count]
+
+    def clear(self):
+        self.count = 0
+        self.size = 0
+        self.indexed.fill(False)
+        self.__views()
+
+    def update(self, positions, live):
+        if not len(live):
+            self.clear()
+            return
+        if len(live) > len(self.indexed):
+            self.__allocate(max(len(live), len(self.indexed) * 2))
+        shrunk = len(live) < self.size
+        self.size = len(live)
+        count = self.count
+        order = self.order
+
+        # Squeeze out the entities that died, keeping the order of the rest. The ones in slots past the end of live died
+        # as well, the clipped take would read the last slot for them.
+        kept = self.kept[:count]
+        np.take(live, order[:count], out=kept, mode="clip")
+        if shrunk:
+            inside = self.added[:count]
+            np.less(order[:count], len(live), out=inside)
+            np.logical_and(kept, inside, out=kept)
+        alive = int(np.count_nonzero(kept))
+        if alive < count:
+            # Every kept entity moves to the number of kept ones before it, the dead ones onto the spare slot at the
+            # end. np.compress would do the same but allocates.
+            places = self.scratch[:count]
+            np.copyto(places, kept)
+            np.cumsum(places, out=places)
+            np.subtract(places, 1, out=places)
+            dead = self.added[:count]
+            np.logical_not(kept, out=dead)
+            np.copyto(places, len(self.previous) - 1, where=dead)
+            self.previous.put(places, order[:count], mode="clip")
+            order[:alive] = self.previous[:alive]
+            count = alive
+
+        # Entities that are live but not in the index yet go to the end.
+        indexed = self.indexed[:len(live)]
+        added = self.added[:len(live)]
+        indexed.fill(False)
+        indexed[order[:count]] = True
+        np.greater(live, indexed, out=added)
+        new = int(np.count_nonzero(added))
+        if new:
+            order[count:count + new] = np.flatnonzero(added)
+            count += new
+        self.count = count
+
+        keys = self.keys[:count]
+        np.take(positions, order[:count], out=keys, mode="clip")
+        # An entity is out of place if it is below the highest position before it.
+        highest = self.highest[:count]
+        np.maximum.accumulate(keys, out=highest)
+        misplaced = self.kept[:max(count - 1, 0)]
+        np.less(keys[1:], highest[:-1], out=misplaced)
+        moves = int(np.count_nonzero(misplaced))
+        if moves > self.resort:
+            # Full sort in place, on the position and the current place of every entity combined into one number, so
+            # entities at the same position keep their order.
+            low = int(keys.min())
+            combined = highest
+            np.subtract(keys, low, out=combined)
+            np.multiply(combined, count, out=combined)
+            np.add(combined, self.places[:count], out=combined)
+            combined.sort()
+            places = self.scratch[:count]
+            np.remainder(combined, count, out=places)
+            np.floor_divide(combined, count, out=keys)
+            np.add(keys, low, out=keys)
+            previous = self.previous[:count]
+            np.copyto(previous, order[:count])
+            np.take(previous, places, out=order[:count], mode="clip")
+        elif moves:
+            # Everything in front of an out of place entity is sorted already, it goes after the last one at or below
+            # it, which keeps entities at the same position in the order they had.
+            for i in np.flatnonzero(misplaced).tolist():
+                i += 1
+                key = keys[i]
+                slot = order[i]
+                j = int(np.searchsorted(keys[:i], key, side="right"))
+                keys[j + 1:i + 1] = keys[j:i]
+                order[j + 1:i + 1] = order[j:i]
+                keys[j] = key
+                order[j] = slot
+        self.__views()
+
+    # Ids of the entities with low < position < high.
+    def between(self, low, high):
+        start = np.searchsorted(self.positions, low, side="right")
+        end = np.searchsorted(self.positions, high, side="left")
+        return self.ids[start:end]
+
+    # Id of the entity closest to position at or below it, None if there is none.
+    def below(self, position):
+        i = np.searchsorted(self.positions, position, side="right") - 1
+        return int(self.ids[i]) if i >= 0 else None
+
+    # Id of the entity closest to position at or above it, None if there is none.
+    def above(self, position):
+        i = np.searchsorted(self.positions, position, side="left")
+        return int(self.ids[i]) if i < len(self.ids) else None
+
+
+# Returns the index called name of the world, creating it if it does not exist yet.
+def index_for(world, name):
+    indices = world.setdefault("spatial", {})
+    if name not in indices:
+        indices[name] = SpatialIndex()
+    return indices[name]
@@ -0,0 +1,533 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Benchmarks for the hot paths of the game: the color and fixed point math, the screensaver effects, the LED string
+# operations, the renderer, the entity collisions and the particles. Every benchmark is run for a range of string
+# lengths or entity counts, the results are written as JSON and can be compared against a stored baseline, failing when
+# anything got slower than allowed.
+#
+#   python bench.py --output results.json              run everything and store the results
+#   python bench.py --baseline results.json            run again and compare against the stored results
+#   python bench.py --filter screensaver --quick       only run some of the benchmarks with fewer repetitions
+#   python bench.py --allocations                      check that game and screensaver frames stay within the
+#                                                      allocation budget
+
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import LEDString
+import Game
+import Screensaver
+import Player
+import Enemy
+import Particle
+import Palette
+import colorutils
+import lib8tion
+
+LENGTHS = (144, 1000, 10000)
+ENTITY_COUNTS = (1, 100, 1000)
+
+benchmarks = []
+# Benchmarks running the code of a game or screensaver frame, with --allocations these have to stay within the budget.
+frame_path = set()
+
+
+# Registers a benchmark. The function gets called with the parameter and returns the function to time, so that all
+# the setup happens outside of the measurement.
+def benchmark(name, params=(None,), frame=False):
+    def register(setup):
+        for param in params:
+            benchmarks.append((name, param, setup))
+            if frame:
+                frame_path.add(run_name(name, param))
+        return setup
+    return register
+
+
+def run_name(name, param):
+    return name if param is None else f"{name}[{param}]"
+
+
+# Best time per call out of several rounds, each round repeating the call long enough to get a stable reading.
+def measure(func, min_time=0.05, rounds=5):
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 10 or number >= 1 << 20:
+            break
+        number *= 10
+    number = max(1, int(number * (min_time / 10) / elapsed)) if elapsed else number
+
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+# Bytes allocated during a single call, the most and the average over a number of calls. Anything a call allocates
+# counts, even if it is freed again before it returns. The first calls are not measured, they fill caches and create
+# buffers that are reused afterwards.
+def measure_allocations(func, calls=300, warmup=20):
+    for _ in range(warmup):
+        func()
+    worst = total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            allocated = tracemalloc.get_traced_memory()[1] - before
+            worst = max(worst, allocated)
+            total += allocated
+    finally:
+        tracemalloc.stop()
+    return worst, total / calls
+
+
+def array_string(length):
+    return LEDString.ArrayLEDString(length)
+
+
+# Color math
+
+@benchmark("scale8")
+def bench_scale8(_):
+    scale8 = LEDString.scale8
+
+    def run():
+        for i in range(256):
+            scale8(i, 200)
+    return run
+
+
+@benchmark("hsv_rainbow")
+def bench_hsv_rainbow(_):
+    hsv_rainbow = LEDString.hsv_rainbow
+
+    def run():
+        for h in range(256):
+            hsv_rainbow(h, 200, 150)
+    return run
+
+
+# Fixed point trig against the float versions it replaces.
+
+@benchmark("sin16")
+def bench_sin16(_):
+    sin16 = lib8tion.sin16
+
+    def run():
+        for t in range(0, 65536, 256):
+            sin16(t * 7)
+    return run
+
+
+@benchmark("math_sin")
+def bench_math_sin(_):
+    sin = math.sin
+
+    def run():
+        for t in range(0, 65536, 256):
+            int(sin(t * 7 / 10430.378) * 32767)
+    return run
+
+
+@benchmark("beatsin8")
+def bench_beatsin8(_):
+    beatsin8 = lib8tion.beatsin8
+
+    def run():
+        for t in range(0, 65536, 256):
+            beatsin8(60, t, 20, 200)
+    return run
+
+
+@benchmark("sin16_array", LENGTHS)
+def bench_sin16_array(length):
+    np = LEDString.np
+    angles = np.arange(length) * 97
+    return lambda: lib8tion.sin16(angles)
+
+
+@benchmark("np_sin_array", LENGTHS)
+def bench_np_sin_array(length):
+    np = LEDString.np
+    angles = np.arange(length) * 97
+    return lambda: (np.sin(angles / 10430.378) * 32767).astype(np.int32)
+
+
+@benchmark("hsv_rainbow_array", LENGTHS)
+def bench_hsv_rainbow_array(length):
+    np = LEDString.np
+    hues = np.arange(length) % 256
+
+    def run():
+        LEDString.hsv_rainbow_array(hues, 200, 150)
+    return run
+
+
+# Screensaver effects, every mode runs for 3 seconds so we just pick the time inside of each modes window.
+
+def bench_screensaver_mode(mode, ledstring):
+    screensaver = Screensaver.Screensaver(ledstring, seed=0)
+    times = [mode * 3000 + t for t in range(0, 3000, 17)]
+    state = {"n": 0}
+
+    def run():
+        screensaver.tick(times[state["n"] % len(times)])
+        state["n"] += 1
+    return run
+
+
+for _mode in range(5):
+    benchmark(f"screensaver_mode{_mode}", LENGTHS, frame=True)(
+        lambda length, mode=_mode: bench_screensaver_mode(mode, array_string(length)))
+    benchmark(f"screensaver_mode{_mode}_list", (144,), frame=True)(
+        lambda length, mode=_mode: bench_screensaver_mode(mode, LEDString.LEDString(length)))
+
+
+# LED string operations
+
+@benchmark("clear", LENGTHS, frame=True)
+def bench_clear(length):
+    return array_string(length).clear
+
+
+@benchmark("clear_list", (144,), frame=True)
+def bench_clear_list(length):
+    return LEDString.LEDString(length).clear
+
+
+@benchmark("nscale8", LENGTHS, frame=True)
+def bench_nscale8(length):
+    ledstring = array_string(length)
+    ledstring.fill((200, 100, 50))
+    return lambda: ledstring.nscale8(250)
+
+
+@benchmark("fill_palette", LENGTHS)
+def bench_fill_palette(length):
+    ledstring = array_string(length)
+    return lambda: Palette.fill_palette(ledstring, Palette.RAINBOW, 0, 3, brightness=200)
+
+
+@benchmark("fade_to_black_by", LENGTHS)
+def bench_fade_to_black_by(length):
+    ledstring = array_string(length)
+    ledstring.fill((200, 100, 50))
+    return lambda: colorutils.fade_to_black_by(ledstring, 20)
+
+
+@benchmark("blur1d", LENGTHS)
+def bench_blur1d(length):
+    ledstring = array_string(length)
+    ledstring.fill((200, 100, 50))
+    return lambda: colorutils.blur1d(ledstring, 64)
+
+
+# Rendering, both a full repaint and an update where only one LED changed.
+
+def pygame_sink(length):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import PygameSink
+    sink = PygameSink.PygameSink(length)
+    sink.open()
+    return sink
+
+
+@benchmark("draw_full", LENGTHS)
+def bench_draw_full(length):
+    sink = pygame_sink(length)
+    ledstring = array_string(length)
+
+    def run():
+        sink.invalidate()
+        sink.show(ledstring.frame())
+    return run
+
+
+@benchmark("draw_one_changed", LENGTHS)
+def bench_draw_one_changed(length):
+    sink = pygame_sink(length)
+    ledstring = array_string(length)
+    state = {"n": 0}
+
+    def run():
+        state["n"] += 1
+        ledstring[length // 2].rgb((state["n"] % 256, 0, 0))
+        sink.show(ledstring.frame())
+    return run
+
+
+# Entities
+
+@benchmark("player_collide", ENTITY_COUNTS)
+def bench_player_collide(count):
+    ledstring = array_string(1000)
+    world = {}
+    player = Player.Player(ledstring, world)
+    player.position = 10
+    for i in range(count):
+        # All enemies in front of the player, so nobody gets hit and every enemy is checked.
+        Enemy.Enemy(ledstring, world).spawn(20 + i % 900, 0)
+    return player.collide
+
+
+@benchmark("enemy_tick_collide", ENTITY_COUNTS)
+def bench_enemy_tick_collide(count):
+    ledstring = array_string(1000)
+    world = {}
+    player = Player.Player(ledstring, world)
+    player.attack(0)
+    enemies = []
+    for i in range(count):
+        enemy = Enemy.Enemy(ledstring, world)
+        enemy.spawn(100 + i % 800, 1, wobble=i % 2 * 20)
+        enemies.append(enemy)
+    state = {"t": 0}
+
+    def run():
+        state["t"] += 16
+        for enemy in enemies:
+            enemy.tick(state["t"])
+            enemy.collide()
+        # Keep them alive, we want to measure the same amount of work every round.
+        for enemy in enemies:
+            if not enemy.alive:
+                enemy.spawn(100, 1)
+    return run
+
+
+@benchmark("pool_player_collide", ENTITY_COUNTS)
+def bench_pool_player_collide(count):
+    ledstring = array_string(1000)
+    world = {}
+    player = Player.Player(ledstring, world)
+    player.position = 10
+    pool = Enemy.EnemyPool(ledstring, world)
+    for i in range(count):
+        pool.spawn(20 + i % 900, 0)
+    return player.collide
+
+
+@benchmark("pool_tick_collide", ENTITY_COUNTS)
+def bench_pool_tick_collide(count):
+    ledstring = array_string(1000)
+    world = {}
+    player = Player.Player(ledstring, world)
+    player.attack(0)
+    pool = Enemy.EnemyPool(ledstring, world)
+    for i in range(count):
+        pool.spawn(100 + i % 800, 1, wobble=i % 2 * 20)
+    state = {"t": 0}
+
+    def run():
+        state["t"] += 16
+        pool.tick(state["t"])
+        pool.collide()
+        # Keep them alive, we want to measure the same amount of work every round.
+        while len(pool) < count:
+            pool.spawn(100, 1)
+    return run
+
+
+# A whole game step in the steady state of the first level: the enemy wobbling in its place and the player at the start
+# attacking every now and then.
+
+def bench_game_step(game):
+    times = list(range(16, 16 * 60 * 60, 16))
+    state = {"n": 0}
+
+    def run():
+        n = state["n"] % len(times)
+        time = times[n]
+        if n % 40 == 0:
+            game.handle("attack", time)
+        game.update(time)
+        game.collide()
+        game.draw(time)
+        game.ledstring.frame()
+        state["n"] = n + 1
+    return run
+
+
+benchmark("game_step", LENGTHS, frame=True)(lambda length: bench_game_step(Game.Game(array_string(length), seed=0)))
+benchmark("game_step_list", (144,), frame=True)(
+    lambda length: bench_game_step(Game.Game(LEDString.LEDString(length), seed=0)))
+
+
+# The same with a crowd: an enemy wobbling in place every ten LEDs along the string, and bursts of particles going off
+# all the time, about a hundred of them alive at any moment.
+@benchmark("game_step_busy", LENGTHS, frame=True)
+def bench_game_step_busy(length):
+    game = Game.Game(array_string(length), seed=0)
+    for position in range(length // 4, length, 10):
+        game.enemies.spawn(position, 1 + position % 4, wobble=5 + position % 20)
+    run = bench_game_step(game)
+    state = {"n": 0}
+
+    def busy():
+        state["n"] += 1
+        if state["n"] % 10 == 0:
+            game.particles.burst(state["n"] * 7 % length, 40, (255, 64, 0))
+        run()
+    return busy
+
+
+@benchmark("particles", (100, 1000, 4000))
+def bench_particles(count):
+    ledstring = array_string(1000)
+    particles = Particle.ParticlePool(ledstring, {}, capacity=4096, seed=0)
+
+    def run():
+        # Topping up the pool keeps the number of live particles the same every round.
+        if len(particles) < count:
+            particles.burst(500, count - len(particles), (255, 64, 0), life=1000)
+        particles.tick(0)
+        particles.draw()
+    return run
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - threshold:
+            marker = "  faster"
+        print(f"{name:40} {baseline[name] * 1e6:12.2f}us -> {seconds * 1e6:12.2f}us {ratio:6.2f}x{marker}")
+    return regressions
+
+
+# The frame path only allocates small Python and numpy objects that do not depend on the length of the string or the
+# number of entities. numpy calls alone take some hundred bytes each, np.add.at for the particles about 5k. Anything
+# that grows with the string goes over this at 10000 LEDs.
+ALLOCATION_BUDGET = 8192
+# Allowed difference between the shortest and the longest string of a frame benchmark, a few small objects like ints
+# that get bigger.
+ALLOCATION_GROWTH = 256
+
+
+def check_allocations(filter, budget):
+    over = []
+    for name, param, setup in benchmarks:
+        full_name = run_name(name, param)
+        if filter not in full_name:
+            continue
+        try:
+            func = setup(param)
+        except ImportError as error:
+            print(f"{full_name:40} skipped: {error}")
+            continue
+        worst, average = measure_allocations(func)
+        marker = ""
+        if full_name in frame_path and worst > budget:
+            marker = "  OVER BUDGET"
+            over.append(full_name)
+        print(f"{full_name:40} {worst:10}B max {average:12.1f}B avg{marker}")
+    if over:
+        print(f"\n{len(over)} frame benchmark(s) allocate more than {budget} bytes per call")
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="pyTWANG benchmarks")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against the results stored in this file")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown against the baseline that counts as a regression")
+    parser.add_argument("--quick", action="store_true", help="shorter measurements, less stable numbers")
+    parser.add_argument("--list", action="store_true", help="only list the benchmarks")
+    parser.add_argument("--allocations", action="store_true",
+                        help="count the bytes allocated per call instead of timing, the game and screensaver frame "
+                             "benchmarks fail when they go over the budget")
+    parser.add_argument("--allocation-budget", type=int, default=ALLOCATION_BUDGET,
+                        help="bytes a single frame benchmark call may allocate")
+    args = parser.parse_args()
+
+    if args.allocations:
+        return check_allocations(args.filter, args.allocation_budget)
+
+    min_time, rounds = (0.01, 3) if args.quick else (0.05, 5)
+
+    results = {}
+    for name, param, setup in benchmarks:
+        full_name = run_name(name, param)
+        if args.filter not in full_name:
+            continue
+        if args.list:
+            print(full_name)
+            continue
+        try:
+            func = setup(param)
+        except ImportError as error:
+            print(f"{full_name:40} skipped: {error}")
+            continue
+        results[full_name] = measure(func, min_time, rounds)
+        print(f"{full_name:40} {results[full_name] * 1e6:12.2f}us")
+
+    if args.list:
+        return 0
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        print()
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
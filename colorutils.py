@@ -0,0 +1,116 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Whole string color operations after FastLED's lib8tion and colorutils. They work on an ArrayLEDString, a plain
+# LEDString or directly on an N x 3 uint8 array, always on all LEDs at once.
+#
+# The math follows FastLED, so the scaling uses the fixed scale8 of lib8tion, (i * (1 + scale)) >> 8, and not the
+# scale8 of LEDString.
+
+from lib8tion import scale8
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Saturating add and subtract of 8bit values, for ints or arrays.
+def qadd8(i, j):
+    if np is not None and (isinstance(i, np.ndarray) or isinstance(j, np.ndarray)):
+        return np.minimum(np.add(i, j, dtype=np.int32), 255).astype(np.uint8)
+    return min(i + j, 255)
+
+
+def qsub8(i, j):
+    if np is not None and (isinstance(i, np.ndarray) or isinstance(j, np.ndarray)):
+        return np.maximum(np.subtract(i, j, dtype=np.int32), 0).astype(np.uint8)
+    return max(i - j, 0)
+
+
+# Blends b into a by amount_of_b out of 255, the FASTLED_BLEND_FIXED version.
+def blend8(a, b, amount_of_b):
+    return ((a << 8) + b + b * amount_of_b - a * amount_of_b) >> 8
+
+
+# The colors of target as an int32 array, plus a function writing a result back into target.
+def _colors(target):
+    if hasattr(target, "buffer"):
+        target = target.buffer
+    if isinstance(target, np.ndarray):
+        def store(colors):
+            np.copyto(target, colors, casting="unsafe")
+        return target.astype(np.int32), store
+
+    def store(colors):
+        for led, color in zip(target, colors.tolist()):
+            led.rgb(tuple(color))
+    return np.array([led.rgb() for led in target], dtype=np.int32), store
+
+
+# Dims all LEDs by fade_by out of 255.
+def fade_to_black_by(target, fade_by):
+    colors, store = _colors(target)
+    store(scale8(colors, 255 - fade_by))
+
+
+# Blends overlay into the LEDs by amount out of 255. The overlay is one color for all LEDs or a color per LED.
+def nblend(target, overlay, amount):
+    if amount == 0:
+        return
+    colors, store = _colors(target)
+    overlay = np.broadcast_to(np.asarray(overlay, dtype=np.int32), colors.shape)
+    if amount == 255:
+        store(overlay)
+        return
+    store(blend8(colors, overlay, amount))
+
+
+# Every LED keeps 255 - amount of its light and gives amount / 2 to each of its neighbours, adding up saturating. This
+# is FastLED's blur1d, which does the same LED by LED carrying the light over to the next one.
+def blur1d(target, amount):
+    colors, store = _colors(target)
+    keep = 255 - amount
+    seep = amount >> 1
+    part = scale8(colors, seep)
+    result = scale8(colors, keep)
+    result[1:] += part[:-1]
+    result[:-1] += part[1:]
+    store(np.minimum(result, 255))
+
+
+# Fills the LEDs from start to end, both included, with a gradient from start_color to end_color. The gradient steps in
+# 8.8 fixed point like fill_gradient_RGB, including its rounding.
+def fill_gradient(target, start, start_color, end, end_color):
+    if end < start:
+        start, end = end, start
+        start_color, end_color = end_color, start_color
+    colors, store = _colors(target)
+    start_color = np.asarray(start_color, dtype=np.int32)
+    end_color = np.asarray(end_color, dtype=np.int32)
+    # (end - start) << 7 divided by the number of steps, truncating towards zero like C does, doubled.
+    distance = (end_color - start_color) << 7
+    divisor = (end - start) or 1
+    delta = np.sign(distance) * (np.abs(distance) // divisor) * 2
+    steps = np.arange(end - start + 1, dtype=np.int32)[:, np.newaxis]
+    colors[start:end + 1] = (((start_color << 8) + steps * delta) & 0xFFFF) >> 8
+    store(colors)
@@ -0,0 +1,213 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Fixed point math after FastLED's lib8tion: sine and cosine approximations on 8 and 16 bit angles, beat generators
+# driven by the game time and linear interpolation. Everything is integer math, so the results are the same on every
+# platform, down to MicroPython. The functions take ints, and where noted numpy arrays as well.
+#
+# Angles go once around the circle from 0 to 256 for the 8 bit functions and from 0 to 65536 for the 16 bit ones.
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def scale8(i, scale):
+    return (i * (scale + 1)) >> 8
+
+
+def scale16(i, scale):
+    return (i * (scale + 1)) >> 16
+
+
+# sin8_C: the sine as 0 to 255 around 128, piecewise linear over four sections per quarter.
+def _sin8(theta):
+    offset = theta
+    if theta & 0x40:
+        offset = 255 - offset
+    offset &= 0x3F
+    secoffset = offset & 0x0F
+    if theta & 0x40:
+        secoffset += 1
+    section = offset >> 4
+    b, m16 = _sin8_interleave[section * 2], _sin8_interleave[section * 2 + 1]
+    y = ((m16 * secoffset) >> 4) + b
+    if theta & 0x80:
+        y = -y
+    return y + 128
+
+
+# sin16_C: the sine as -32767 to 32767, piecewise linear over eight sections per quarter.
+def _sin16(theta):
+    offset = (theta & 0x3FFF) >> 3
+    if theta & 0x4000:
+        offset = 2047 - offset
+    section = offset // 256
+    y = _sin16_slope[section] * ((offset & 0xFF) // 2) + _sin16_base[section]
+    if theta & 0x8000:
+        y = -y
+    return y
+
+
+_sin8_interleave = (0, 49, 49, 41, 90, 27, 117, 10)
+_sin16_base = (0, 6393, 12539, 18204, 23170, 27245, 30273, 32137)
+_sin16_slope = (49, 48, 44, 38, 31, 23, 14, 4)
+
+# The values are looked up from tables made once with the functions above. Without numpy the 16 bit table would be too
+# big for the small targets, so sin16 is computed every time there.
+_sin8_table = [_sin8(theta) for theta in range(256)]
+_sin16_table = None
+if np is not None:
+    _sin8_array = np.array(_sin8_table, dtype=np.uint8)
+    _sin16_array = np.array([_sin16(theta) for theta in range(65536)], dtype=np.int32)
+    _sin16_table = _sin16_array.tolist()
+
+
+# Sine of an 8 bit angle as 0 to 255, ints or arrays.
+def sin8(theta):
+    if np is not None and isinstance(theta, np.ndarray):
+        return _sin8_array[theta & 0xFF]
+    return _sin8_table[theta & 0xFF]
+
+
+def cos8(theta):
+    return sin8(theta + 64)
+
+
+# Sine of a 16 bit angle as -32767 to 32767, ints or arrays. For arrays the result can go into out, an int32 array of
+# the same shape, instead of a new array.
+def sin16(theta, out=None):
+    if np is not None and isinstance(theta, np.ndarray):
+        if out is not None:
+            # Wrapping the index is the same as masking the angle to 16 bits.
+            return np.take(_sin16_array, theta, out=out, mode="wrap")
+        return _sin16_array[theta & 0xFFFF]
+    if _sin16_table is None:
+        return _sin16(theta & 0xFFFF)
+    return _sin16_table[theta & 0xFFFF]
+
+
+def cos16(theta):
+    return sin16(theta + 16384)
+
+
+# A sawtooth going from 0 to 65535 bpm88 / 256 times a minute, time and timebase in milliseconds.
+def beat88(bpm88, time, timebase=0):
+    return (((time - timebase) * bpm88 * 280) >> 16) & 0xFFFF
+
+
+# Same with the beats per minute as an integer, values of 256 and up are taken as 8.8 fixed point like FastLED does.
+def beat16(bpm, time, timebase=0):
+    if bpm < 256:
+        bpm <<= 8
+    return beat88(bpm, time, timebase)
+
+
+def beat8(bpm, time, timebase=0):
+    return beat16(bpm, time, timebase) >> 8
+
+
+# A sine wave between lowest and highest, bpm times a minute.
+def beatsin8(bpm, time, lowest=0, highest=255, timebase=0, phase_offset=0):
+    beat = beat8(bpm, time, timebase)
+    return (lowest + scale8(sin8(beat + phase_offset), (highest - lowest) & 0xFF)) & 0xFF
+
+
+def beatsin16(bpm, time, lowest=0, highest=65535, timebase=0, phase_offset=0):
+    beat = beat16(bpm, time, timebase)
+    return (lowest + scale16(sin16(beat + phase_offset) + 32768, (highest - lowest) & 0xFFFF)) & 0xFFFF
+
+
+# Linear interpolation from a to b by frac out of 256, lerp8by8 in FastLED.
+def lerp8(a, b, frac):
+    if b > a:
+        return a + scale8(b - a, frac)
+    return a - scale8(a - b, frac)
+
+
+# FastLED's random8 and random16: a 16 bit linear congruential generator, seed = seed * 2053 + 13849. Every generator
+# has a seed of its own instead of the one global seed of FastLED.
+RAND16_SEED = 1337
+RAND16_MULTIPLIER = 2053
+RAND16_ADD = 13849
+
+
+class Random:
+
+    def __init__(self, seed=RAND16_SEED):
+        self.seed = seed & 0xFFFF
+        self.scratch = None
+
+    def random16(self):
+        self.seed = (self.seed * RAND16_MULTIPLIER + RAND16_ADD) & 0xFFFF
+        return self.seed
+
+    # The low and high byte of the seed added up, scaled to 0 to lim - 1 if lim is given.
+    def random8(self, lim=None):
+        seed = self.random16()
+        r = ((seed & 0xFF) + (seed >> 8)) & 0xFF
+        if lim is not None:
+            r = (r * lim) >> 8
+        return r
+
+    # The same values as count calls of random8(lim), as a uint32 array that is reused by the next call. The seeds
+    # of all the calls come from the seed before them in one step, with the multiplier and increment of every step
+    # count precomputed.
+    def random8_array(self, count, lim=None):
+        if self.scratch is None or len(self.scratch[0]) < count:
+            self.scratch = (np.zeros(count, dtype=np.uint32), np.zeros(count, dtype=np.uint32))
+        multipliers, increments = _rand16_jumps(count)
+        seeds, high = (array[:count] for array in self.scratch)
+        np.multiply(multipliers, self.seed, out=seeds)
+        np.add(seeds, increments, out=seeds)
+        np.bitwise_and(seeds, 0xFFFF, out=seeds)
+        if count:
+            self.seed = int(seeds[-1])
+        np.right_shift(seeds, 8, out=high)
+        np.bitwise_and(seeds, 0xFF, out=seeds)
+        np.add(seeds, high, out=seeds)
+        np.bitwise_and(seeds, 0xFF, out=seeds)
+        if lim is not None:
+            np.multiply(seeds, lim, out=seeds)
+            np.right_shift(seeds, 8, out=seeds)
+        return seeds
+
+
+# Multiplier and increment taking a seed i + 1 steps ahead at index i, both 16 bit. Grown as needed and shared by all
+# generators.
+_rand16_tables = None
+
+
+def _rand16_jumps(count):
+    global _rand16_tables
+    if _rand16_tables is None or len(_rand16_tables[0]) < count:
+        multipliers = np.zeros(count, dtype=np.uint32)
+        increments = np.zeros(count, dtype=np.uint32)
+        multiplier, increment = 1, 0
+        for i in range(count):
+            multiplier = (multiplier * RAND16_MULTIPLIER) & 0xFFFF
+            increment = (increment * RAND16_MULTIPLIER + RAND16_ADD) & 0xFFFF
+            multipliers[i] = multiplier
+            increments[i] = increment
+        _rand16_tables = (multipliers, increments)
+    return _rand16_tables[0][:count], _rand16_tables[1][:count]
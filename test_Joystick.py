@@ -0,0 +1,103 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import asyncio
+import socket
+import threading
+import AsyncLoop
+import Game
+import Input
+import Joystick
+import LEDString
+
+
+# Two boards on TCP each have their own tilt, one board going back to the middle does not release the other, and a
+# board that disconnects lets go of what it held.
+def test_boards_over_tcp():
+    queued = Input.QueuedInput()
+    loop = AsyncLoop.AsyncLoop(None, [], queued, None, None, queued)
+
+    async def run():
+        server = await Joystick.listen("tcp:127.0.0.1:0", loop.joystick_sample, loop.joystick_closed)
+        port = server.sockets[0].getsockname()[1]
+        boards = [await asyncio.open_connection("127.0.0.1", port) for _ in range(2)]
+        for (_, writer), line in zip(boards, ("20 0\n", "20 0\n")):
+            writer.write(line.encode("ascii"))
+            await writer.drain()
+            await asyncio.sleep(0.05)
+        boards[1][1].write(b"0 0\n")
+        await boards[1][1].drain()
+        await asyncio.sleep(0.05)
+        held = queued.poll(0)
+        boards[0][1].close()
+        await asyncio.sleep(0.05)
+        released = queued.poll(1)
+        boards[1][1].close()
+        server.close()
+        await server.wait_closed()
+        return held, released
+
+    held, released = asyncio.run(run())
+    assert held == ["right_press", "right_press", "right_release"]
+    assert released == ["right_release"]
+
+
+# The keyboard and the joystick holding the same direction still move the player one LED per step.
+def test_one_speed():
+    game = Game.Game(LEDString.ArrayLEDString(144), seed=0)
+    game.handle("right_press", 0)
+    game.handle("right_press", 0)
+    game.update(0)
+    assert game.player.speed == 1
+    game.handle("right_release", 16)
+    game.update(16)
+    assert game.player.speed == 1
+    game.handle("right_release", 33)
+    game.update(33)
+    assert game.player.speed == 0
+
+
+# The stand in for the board stops without an exception when nobody listens, or when the listener goes away.
+def test_send_without_listener():
+    for kind in (socket.SOCK_DGRAM, socket.SOCK_STREAM):
+        sock = socket.socket(socket.AF_INET, kind)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        protocol = "udp" if kind == socket.SOCK_DGRAM else "tcp"
+        assert Joystick.send("{}:127.0.0.1:{}".format(protocol, port), rate=1000, duration=1) < 1000
+
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+
+    def accept():
+        connection, _ = server.accept()
+        connection.recv(64)
+        connection.close()
+        server.close()
+
+    thread = threading.Thread(target=accept)
+    thread.start()
+    sent = Joystick.send("tcp:127.0.0.1:{}".format(server.getsockname()[1]), rate=1000, duration=2)
+    thread.join()
+    assert 0 < sent < 2000
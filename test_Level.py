@@ -0,0 +1,58 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import pytest
+import Game
+import LEDString
+import Level
+
+
+def spawner_level(**spawner):
+    return {"name": "test", "spawners": [dict({"position": 500, "interval": 1000}, **spawner)]}
+
+
+def test_spawner_count():
+    assert Level.compile_level(spawner_level(count=3), 144).queue == [(0, 0, 3)]
+    assert Level.compile_level(spawner_level(), 144).queue == [(0, 0, -1)]
+    for count in (0, -2):
+        with pytest.raises(ValueError):
+            Level.compile_level(spawner_level(count=count), 144)
+
+
+# Reaching the exit with enemies alive starts the next level on a cleared pool, the spatial indices must not keep the
+# slots of the old enemies.
+def test_level_switch_with_enemies():
+    game = Game.Game(LEDString.ArrayLEDString(145), seed=0, level=2)
+    time = 0
+    for step in range(420):
+        time = step * 1000 // 60
+        game.update(time)
+        game.collide()
+    assert len(game.enemies)
+    game.player.position = game.level.level.exit
+    for step in range(420, 430):
+        time = step * 1000 // 60
+        game.update(time)
+        game.collide()
+    assert game.level.index == 3
+    for index in game.enemies.sides.values():
+        assert all(game.enemies.alive[slot] for slot in index.ids.tolist())
@@ -0,0 +1,104 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import socket
+import struct
+import numpy as np
+import NetworkSink
+
+
+def frame(length):
+    return np.arange(length * 3, dtype=np.uint32).astype(np.uint8).reshape(length, 3)
+
+
+# Sends two frames through the sink to a socket on localhost and returns the packets of the second one.
+def send(sink_class, data, **options):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.settimeout(1.0)
+    try:
+        with sink_class("127.0.0.1", listener.getsockname()[1], fps=0, **options) as sink:
+            sink.show(data)
+            sink.show(data)
+            packets = -(-data.size // (NetworkSink.DDP_MAX_DATA if sink_class is NetworkSink.DDPSink
+                                       else NetworkSink.E131_CHANNELS))
+            received = [listener.recv(2048) for _ in range(2 * packets)]
+            assert sink.stats()["packets"] == 2 * packets
+        return received[packets:]
+    finally:
+        listener.close()
+
+
+# 600 LEDs are 1800 bytes, a full packet of 1440 and the remaining 360, only the last one pushes the frame.
+def test_ddp():
+    data = frame(600)
+    packets = send(NetworkSink.DDPSink, data)
+    payload = b""
+    for n, packet in enumerate(packets):
+        flags, sequence, data_type, destination, offset, length = struct.unpack_from(">BBBBLH", packet)
+        assert flags == NetworkSink.DDP_VERSION_1 | (NetworkSink.DDP_PUSH if n == len(packets) - 1 else 0)
+        assert sequence == 2
+        assert data_type == NetworkSink.DDP_TYPE_RGB8
+        assert destination == NetworkSink.DDP_ID_DISPLAY
+        assert offset == len(payload)
+        assert length == len(packet) - 10 == min(NetworkSink.DDP_MAX_DATA, data.size - offset)
+        payload += packet[10:]
+    assert payload == data.tobytes()
+
+
+# The same frame goes into universes 7 to 10, 170 LEDs each and the last 90 in the fourth.
+def test_e131():
+    data = frame(600)
+    packets = send(NetworkSink.E131Sink, data, universe=7, source_name="test", priority=150)
+    assert len(packets) == 4
+    payload = b""
+    for n, packet in enumerate(packets):
+        channels = min(NetworkSink.E131_CHANNELS, data.size - len(payload))
+        assert len(packet) == NetworkSink.E131_HEADER_SIZE + channels
+        preamble, postamble, acn_id, root_length, root_vector = struct.unpack_from(">HH12sHL", packet)
+        assert (preamble, postamble, acn_id, root_vector) == (0x0010, 0, b"ASC-E1.17\x00\x00\x00", 4)
+        assert root_length == 0x7000 | (len(packet) - 16)
+        framing_length, framing_vector, name, priority, _, sequence, options, universe = struct.unpack_from(
+            ">HL64sBHBBH", packet, 38)
+        assert framing_length == 0x7000 | (len(packet) - 38)
+        assert framing_vector == 2
+        assert name.rstrip(b"\x00") == b"test"
+        assert (priority, sequence, options, universe) == (150, 2, 0, 7 + n)
+        dmp_length, vector, types, first, increment, count, start_code = struct.unpack_from(">HBBHHHB", packet, 115)
+        assert dmp_length == 0x7000 | (len(packet) - 115)
+        assert (vector, types, first, increment, count, start_code) == (2, 0xa1, 0, 1, channels + 1, 0)
+        assert NetworkSink.decode_e131(packet) == (7 + n, 2, packet[NetworkSink.E131_HEADER_SIZE:])
+        payload += packet[NetworkSink.E131_HEADER_SIZE:]
+    assert payload == data.tobytes()
+
+
+# FrameReceiver puts the frames back together for both protocols.
+def test_receiver():
+    data = frame(600)
+    for protocol, sink_class in (("ddp", NetworkSink.DDPSink), ("e131", NetworkSink.E131Sink)):
+        receiver = NetworkSink.FrameReceiver(protocol, 600)
+        try:
+            with sink_class("127.0.0.1", receiver.port, fps=0) as sink:
+                sink.show(data)
+                assert receiver.receive() == data.tobytes(), protocol
+        finally:
+            receiver.close()
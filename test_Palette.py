@@ -0,0 +1,59 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import Palette
+
+
+# ColorFromPalette for a CRGBPalette16 with LINEARBLEND, transcribed from FastLED's colorutils.cpp with
+# FASTLED_SCALE8_FIXED.
+def color_from_palette(entries, index, brightness):
+    def scale8(i, scale):
+        return (i * (1 + scale)) >> 8
+
+    hi4 = index >> 4
+    lo4 = index & 0x0F
+    color = list(entries[hi4])
+    if lo4:
+        other = entries[0 if hi4 == 15 else hi4 + 1]
+        f2 = lo4 << 4
+        f1 = 255 - f2
+        color = [scale8(a, f1) + scale8(b, f2) for a, b in zip(color, other)]
+    if brightness != 255:
+        if brightness:
+            brightness += 1
+            color = [scale8(channel, brightness) if channel else 0 for channel in color]
+        else:
+            color = [0, 0, 0]
+    return color
+
+
+def test_fastled_reference():
+    indices = np.arange(256)
+    for palette in (Palette.RAINBOW, Palette.LAVA, Palette.HEAT):
+        for brightness in (0, 1, 64, 128, 200, 254, 255):
+            expected = [color_from_palette(palette.entries, index, brightness) for index in range(256)]
+            colors = Palette.color_from_palette(palette, indices, brightness)
+            assert colors.tolist() == expected, brightness
+    # A few values worked out by hand, including the blend from the last entry back to the first.
+    assert Palette.color_from_palette(Palette.RAINBOW, [8, 100], 200).tolist() == [[184, 16, 0], [0, 193, 7]]
+    assert Palette.color_from_palette(Palette.HEAT, [255], 64).tolist() == [[3, 3, 3]]
@@ -0,0 +1,58 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import Enemy
+import LEDString
+import Particle
+import Player
+
+
+# Touching several enemies at once is still one death, with one burst of particles. After the first death the player is
+# back at the start, where the enemy that came from the left would get them again.
+def test_one_death_per_step():
+    ledstring = LEDString.ArrayLEDString(144)
+    world = {}
+    player = Player.Player(ledstring, world)
+    player.position = 50
+    particles = Particle.ParticlePool(ledstring, world, seed=0)
+    pool = Enemy.EnemyPool(ledstring, world)
+    pool.spawn(60, 0)
+    pool.position[0] = 40
+    enemy = Enemy.Enemy(ledstring, world)
+    enemy.spawn(30, 0)
+    enemy.position = 60
+    player.collide()
+    assert player.position == 0
+    assert len(particles) == 200
+
+
+# Attacking next to either end of the string draws only what is on the string, without wrapping around to the other end.
+def test_attack_at_the_ends():
+    for length in (144, 145):
+        for position in (0, 2, length - 3, length - 1):
+            ledstring = LEDString.ArrayLEDString(length)
+            player = Player.Player(ledstring, {})
+            player.position = position
+            player.attack(0)
+            player.draw(0)
+            lit = ledstring.buffer.any(axis=1).nonzero()[0]
+            assert abs(lit - position).max() <= player.attack_width // 2, (length, position)
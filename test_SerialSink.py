@@ -0,0 +1,70 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import pytest
+import SerialSink
+
+
+def frames(length, count, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((length, 3), dtype=np.uint8)
+    for _ in range(count):
+        frame[rng.integers(0, length, 5)] = rng.integers(0, 256, (5, 3))
+        yield frame.copy()
+
+
+# A lost delta must not leave the strip wrong until the next keyframe, the decoder waits for that keyframe instead.
+def test_lost_delta():
+    encoder = SerialSink.FrameEncoder(144, keyframe_interval=10)
+    decoder = SerialSink.SerialDecoder(144)
+    shown = []
+    for i, frame in enumerate(frames(144, 30)):
+        packet = encoder.encode(frame)
+        if i == 3:
+            continue
+        for decoded in decoder.feed(packet):
+            shown.append((i, decoded))
+            assert np.array_equal(decoded, frame), i
+    assert decoder.gaps == 1
+    assert [i for i, _ in shown] == [0, 1, 2] + list(range(10, 30))
+
+
+def test_span_past_the_end():
+    decoder = SerialSink.SerialDecoder(10)
+    assert len(decoder.feed(SerialSink._packet(SerialSink.RAW_KEYFRAME, 1, bytes(30)))) == 1
+    span = bytes((0, 8, 0, 4)) + bytes(range(12))
+    assert decoder.feed(SerialSink._packet(SerialSink.DELTA, 2, span)) == []
+    assert decoder.errors == 1
+    assert not decoder.frame.any()
+
+
+# Keyframes of long strips go past 16 bits of payload.
+def test_long_strip():
+    encoder = SerialSink.FrameEncoder(30000)
+    decoder = SerialSink.SerialDecoder(30000)
+    for frame in frames(30000, 3):
+        frame[::2] = 7
+        decoded = decoder.feed(encoder.encode(frame))
+        assert len(decoded) == 1 and np.array_equal(decoded[0], frame)
+    with pytest.raises(ValueError):
+        SerialSink.FrameEncoder(SerialSink.MAX_LEDS + 1)
@@ -0,0 +1,76 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import SpatialIndex
+
+
+# The order a full stable sort gives: the entities that stay in the order they had, new ones after them by slot.
+def sorted_ids(previous, positions, live):
+    previous = previous[previous < len(live)]
+    kept = previous[live[previous]]
+    indexed = np.zeros(len(live), dtype=bool)
+    indexed[kept] = True
+    ids = np.concatenate((kept, np.flatnonzero(live & ~indexed)))
+    return ids[np.argsort(positions[ids], kind="stable")]
+
+
+# Entities coming and going and moving around, now and then all of them jumping somewhere else, while the number of
+# slots grows past the capacity of the index.
+def test_incremental_update():
+    rng = np.random.default_rng(1)
+    slots = 300
+    positions = rng.integers(0, 1000, slots)
+    live = np.zeros(slots, dtype=bool)
+    index = SpatialIndex.SpatialIndex(capacity=4)
+    expected = np.empty(0, dtype=np.intp)
+    for step in range(2000):
+        live ^= rng.random(slots) < 0.02
+        positions += rng.integers(-3, 4, slots) * (rng.random(slots) < 0.5)
+        if step % 500 == 0:
+            positions = rng.integers(0, 1000, slots)
+        used = min(slots, 50 + step // 10)
+        index.update(positions[:used], live[:used])
+        expected = sorted_ids(expected, positions[:used], live[:used])
+        assert np.array_equal(index.ids, expected), step
+        assert np.array_equal(index.positions, positions[:used][expected]), step
+
+
+# The number of slots going down, to none at all, drops the entities in the slots that went away. After a clear the
+# index starts over, even with fewer slots than before.
+def test_shrinking_slots():
+    rng = np.random.default_rng(2)
+    slots = 200
+    positions = rng.integers(0, 1000, slots)
+    live = rng.random(slots) < 0.7
+    index = SpatialIndex.SpatialIndex(capacity=4)
+    expected = np.empty(0, dtype=np.intp)
+    for used in (200, 150, 180, 40, 0, 60, 1, 120):
+        positions += rng.integers(-3, 4, slots)
+        index.update(positions[:used], live[:used])
+        expected = sorted_ids(expected, positions[:used], live[:used])
+        assert np.array_equal(index.ids, expected), used
+        assert np.array_equal(index.positions, positions[:used][expected]), used
+    index.clear()
+    assert len(index) == 0
+    index.update(positions[:10], live[:10])
+    assert np.array_equal(index.ids, sorted_ids(np.empty(0, dtype=np.intp), positions[:10], live[:10]))
@@ -0,0 +1,38 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import bench
+
+
+# Runs every benchmark of the game and screensaver frame path, including the crowded game and the random screensaver
+# modes at 10000 LEDs. Every frame has to stay within the budget, and none may allocate more on the long string than on
+# the short one, which would mean a temporary that grows with the string or the number of entities.
+def test_frame_path_allocations():
+    worst = {}
+    for name, param, setup in bench.benchmarks:
+        if bench.run_name(name, param) in bench.frame_path:
+            worst.setdefault(name, {})[param] = bench.measure_allocations(setup(param), calls=100)[0]
+    over = {name: sizes for name, sizes in worst.items() if max(sizes.values()) > bench.ALLOCATION_BUDGET}
+    assert not over
+    growing = {name: sizes for name, sizes in worst.items()
+               if sizes[max(sizes)] - sizes[min(sizes)] > bench.ALLOCATION_GROWTH}
+    assert not growing
@@ -0,0 +1,142 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import numpy as np
+import colorutils
+import LEDString
+
+
+# Transcriptions of FastLED's colorutils.cpp and lib8tion, with FASTLED_SCALE8_FIXED and FASTLED_BLEND_FIXED, working
+# LED by LED on lists of [r, g, b] like the C code does on CRGB arrays.
+def scale8(i, scale):
+    return (i * (1 + scale)) >> 8
+
+
+def qadd8(i, j):
+    return min(i + j, 255)
+
+
+def blend8(a, b, amount_of_b):
+    partial = (a << 8) | b
+    partial += b * amount_of_b
+    partial -= a * amount_of_b
+    return partial >> 8
+
+
+def int16(value):
+    value &= 0xFFFF
+    return value - 0x10000 if value & 0x8000 else value
+
+
+def reference_blur1d(leds, blur_amount):
+    leds = [list(led) for led in leds]
+    keep = 255 - blur_amount
+    seep = blur_amount >> 1
+    carryover = [0, 0, 0]
+    for i in range(len(leds)):
+        part = [scale8(channel, seep) for channel in leds[i]]
+        cur = [qadd8(scale8(channel, keep), carry) for channel, carry in zip(leds[i], carryover)]
+        if i:
+            leds[i - 1] = [qadd8(a, b) for a, b in zip(leds[i - 1], part)]
+        leds[i] = cur
+        carryover = part
+    return leds
+
+
+def reference_fill_gradient(leds, startpos, startcolor, endpos, endcolor):
+    leds = [list(led) for led in leds]
+    if endpos < startpos:
+        startpos, endpos = endpos, startpos
+        startcolor, endcolor = endcolor, startcolor
+    distance87 = [int16((end - start) << 7) for start, end in zip(startcolor, endcolor)]
+    divisor = (endpos - startpos) or 1
+    # C division truncates towards zero.
+    delta87 = [int16((abs(distance) // divisor) * (1 if distance >= 0 else -1) * 2) for distance in distance87]
+    color88 = [(channel << 8) & 0xFFFF for channel in startcolor]
+    for i in range(startpos, endpos + 1):
+        leds[i] = [channel >> 8 for channel in color88]
+        color88 = [(channel + delta) & 0xFFFF for channel, delta in zip(color88, delta87)]
+    return leds
+
+
+def reference_nblend(leds, overlay, amount_of_overlay):
+    if amount_of_overlay == 0:
+        return [list(led) for led in leds]
+    if amount_of_overlay == 255:
+        return [list(overlay) for _ in leds]
+    return [[blend8(a, b, amount_of_overlay) for a, b in zip(led, overlay)] for led in leds]
+
+
+def random_leds(rng, length):
+    return rng.integers(0, 256, (length, 3), dtype=np.uint8)
+
+
+def test_blur1d():
+    rng = np.random.default_rng(1)
+    for amount in range(256):
+        leds = random_leds(rng, 40)
+        expected = reference_blur1d(leds.tolist(), amount)
+        ledstring = LEDString.ArrayLEDString(40)
+        ledstring.buffer[:] = leds
+        colorutils.blur1d(ledstring, amount)
+        assert ledstring.buffer.tolist() == expected, amount
+    ledstring = LEDString.LEDString(40)
+    for led, color in zip(ledstring, leds.tolist()):
+        led.rgb(tuple(color))
+    colorutils.blur1d(ledstring, 100)
+    assert [list(led.rgb()) for led in ledstring] == reference_blur1d(leds.tolist(), 100)
+
+
+def test_fill_gradient():
+    rng = np.random.default_rng(2)
+    for n in range(1000):
+        start, end = (int(position) for position in rng.integers(0, 60, 2))
+        if n % 7 == 0:
+            end = start
+        start_color, end_color = (rng.integers(0, 256, 3).tolist() for _ in range(2))
+        leds = random_leds(rng, 60)
+        expected = reference_fill_gradient(leds.tolist(), start, start_color, end, end_color)
+        colorutils.fill_gradient(leds, start, start_color, end, end_color)
+        assert leds.tolist() == expected, (start, start_color, end, end_color)
+
+
+def test_nblend():
+    rng = np.random.default_rng(3)
+    for amount in range(256):
+        leds = random_leds(rng, 20)
+        overlay = rng.integers(0, 256, 3).tolist()
+        expected = reference_nblend(leds.tolist(), overlay, amount)
+        colorutils.nblend(leds, overlay, amount)
+        assert leds.tolist() == expected, amount
+
+
+# CRGB's + and += add saturating per channel, for another LED or a plain color.
+def test_led_add():
+    rng = np.random.default_rng(4)
+    for a, b in rng.integers(0, 256, (500, 2, 3)).tolist():
+        expected = tuple(qadd8(x, y) for x, y in zip(a, b))
+        led = LEDString.LED(tuple(a))
+        assert (led + LEDString.LED(tuple(b))).rgb() == expected
+        assert (led + tuple(b)).rgb() == expected
+        assert led.rgb() == tuple(a)
+        led += tuple(b)
+        assert led.rgb() == expected
@@ -0,0 +1,75 @@
+# Copyright (c) 2020, Piotr Esden-Tempski <piotr@esden.net>
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+# ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR CONTRIBUTORS BE LIABLE FOR
+# ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import argparse
+import os
+import subprocess
+import sys
+import Clock
+import FrameSink
+import Game
+import Layout
+import LEDString
+import NetworkSink
+import Recording
+import SerialSink
+import twang
+
+
+# Every kind of a mixed --sink list has to get a sink of its own kind.
+def test_mixed_sinks():
+    args = argparse.Namespace(host="127.0.0.1", port=None, device="/tmp/twang-test.out", baud=115200)
+    clock = Clock.FixedStepClock(60)
+    kinds = {
+        "null": FrameSink.NullSink,
+        "memory": FrameSink.MemorySink,
+        "serial": SerialSink.SerialSink,
+        "ddp": NetworkSink.DDPSink,
+        "e131": NetworkSink.E131Sink,
+    }
+    for kind, sink_class in kinds.items():
+        sink = twang.make_sink(args, kind, 144, 0, clock)
+        assert type(sink) is sink_class, kind
+    serial = twang.make_sink(args, "serial", 144, 0, clock)
+    assert serial.port == "/tmp/twang-test.out"
+
+
+# The simulation thread hands its frames over with the time of the step they were drawn in, like the other loops.
+def test_threaded_frame_time(tmp_path):
+    path = str(tmp_path / "frames.twf")
+    env = dict(os.environ, SDL_VIDEODRIVER="dummy")
+    for mode in ([], ["--threaded"]):
+        subprocess.run([sys.executable, "twang.py", "--sink", "null", "--frames", "3", "--record", path] + mode,
+                       cwd=os.path.dirname(os.path.abspath(__file__)), env=env, check=True, stdout=subprocess.DEVNULL)
+        with Recording.FramePlayer(path) as player:
+            assert [player.time(index) for index in range(len(player))] == [0, 16, 33], mode
+
+
+# Sinks without stats of their own do not leave blank lines in the report.
+def test_report_without_stats(capsys):
+    clock = Clock.FixedStepClock(60)
+    layout = Layout.parse_layout("72,72r@1")
+    sink = Layout.MappedSink(layout, [FrameSink.NullSink(), FrameSink.NullSink()])
+    twang.report(Game.Game(LEDString.ArrayLEDString(144), seed=0), [sink], clock, (), 0.0)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert all(lines)
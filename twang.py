@@ -22,96 +22,429 @@
 # (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
 # SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import pygame
+import argparse
+import asyncio
+import contextlib
 import sys
+import threading
+import time as systime
 import LEDString
-import Screensaver
-import Player
-import Enemy
+import FrameSink
+import Game
+import Clock
+import Profiler
+import Input
+import Level
+import AsyncLoop
+
+SINKS = ("pygame", "null", "memory", "ddp", "e131", "serial")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="pyTWANG, a 1D dungeon crawler on an LED string.")
+    parser.add_argument("--leds", type=int, default=144, help="length of the LED string")
+    parser.add_argument("--sink", default="pygame",
+                        help="where the frames go: {}, everything but pygame runs headless, a comma separated list "
+                             "of them with --async".format(", ".join(SINKS)))
+    parser.add_argument("--host", default="127.0.0.1", help="pixel controller address for the ddp and e131 sinks")
+    parser.add_argument("--port", type=int, default=None, help="pixel controller port for the ddp and e131 sinks")
+    parser.add_argument("--device", default="/dev/ttyUSB0", help="serial port for the serial sink")
+    parser.add_argument("--baud", type=int, default=115200, help="baud rate for the serial sink")
+    parser.add_argument("--realtime", action="store_true",
+                        help="run headless sinks in real time instead of as fast as possible, implied for hardware "
+                             "outputs")
+    parser.add_argument("--frames", type=int, default=None, help="stop after this many frames")
+    parser.add_argument("--screensaver", action="store_true", help="run the screensaver instead of the game")
+    parser.add_argument("--rate", type=int, default=60, help="simulation steps per second")
+    parser.add_argument("--render-rate", type=int, default=None, help="frames per second, defaults to the step rate")
+    parser.add_argument("--layout", default=None,
+                        help="physical segments, like 300,300r,300@1: lengths, r for reversed, @ for the output")
+    parser.add_argument("--record", default=None, help="record the frames into this file, see Recording.py")
+    parser.add_argument("--levels", default=None, help="level file, levels.json next to twang.py by default")
+    parser.add_argument("--level", type=int, default=0, help="level to start with")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the random numbers, for repeatable runs")
+    parser.add_argument("--record-input", default=None, help="record the input actions into this file")
+    parser.add_argument("--replay", default=None,
+                        help="replay recorded input instead of reading the keyboard, runs headless sinks until it ends")
+    parser.add_argument("--threaded", action="store_true",
+                        help="run the simulation on a thread of its own, rendering and output stay on the main thread")
+    parser.add_argument("--buffers", type=int, choices=(2, 3), default=3,
+                        help="framebuffers between the simulation and the output with --threaded")
+    parser.add_argument("--frame-policy", choices=("drop", "block"), default=None,
+                        help="drop frames or make the simulation wait when the output falls behind with --threaded, "
+                             "drop for real time runs and block otherwise by default")
+    parser.add_argument("--async", dest="asyncio", action="store_true",
+                        help="run the main loop on asyncio, feeding all sinks at once and measuring the input latency")
+    parser.add_argument("--joystick", default=None,
+                        help="read the joystick from udp:HOST:PORT or tcp:HOST:PORT with --async, see Joystick.py")
+    parser.add_argument("--profile", action="store_true", help="time the stages of the main loop")
+    args = parser.parse_args()
+
+    sinks = args.sink.split(",")
+    for kind in sinks:
+        if kind not in SINKS:
+            parser.error("unknown sink {}, choose from {}".format(kind, ", ".join(SINKS)))
+    if len(sinks) > 1 and not args.asyncio:
+        parser.error("several sinks need --async")
+    if sinks.count("pygame") > 1:
+        parser.error("there is only one pygame window")
+    if args.asyncio and args.threaded:
+        parser.error("--async and --threaded do not go together")
+    if args.joystick is not None:
+        if not args.asyncio:
+            parser.error("--joystick needs --async")
+        import Joystick
+        try:
+            Joystick.parse_address(args.joystick)
+        except ValueError as error:
+            parser.error(str(error))
 
     # TWANG globals
     led_size = 13
     led_margin = 1
     led_color = (0, 0, 0)
-    led_string_length = 144
-    led_string = LEDString.LEDString(led_string_length, color=led_color, size=led_size, margin=led_margin)
+    led_string_length = args.leds
+    layout = None
+    if args.layout is not None:
+        import Layout
+        layout = Layout.parse_layout(args.layout)
+        led_string_length = layout.length
+    # The game needs numpy anyway, the list backed LEDString is only there for the LED string code on its own.
+    led_string = LEDString.ArrayLEDString(led_string_length, color=led_color)
     led_string_status = 13
-    screensaver = Screensaver.Screensaver(led_string)
+    window_size = (led_size, led_margin, led_string_status)
+
+    levels = Level.load_levels(led_string_length, args.levels) if args.levels is not None else None
+    game = Game.Game(led_string, screensaver=args.screensaver, seed=args.seed, levels=levels, level=args.level)
+    clock = Clock.FixedStepClock(args.rate, args.render_rate)
+    replay = None
+    if args.replay is not None:
+        replay = Input.ReplayInput(args.replay)
+        if replay.rate != clock.rate:
+            parser.error("{} was recorded at {} steps per second".format(args.replay, replay.rate))
+    # Live input from the joystick needs the game running in real time as well.
+    realtime = args.realtime or args.joystick is not None or any(kind in ("pygame", "ddp", "e131", "serial")
+                                                                 for kind in sinks)
+    # Threaded runs time the simulation and the output separately, each on its own thread. Recordings are made on the
+    # output side and take the time of the frame from the pipeline.
+    pipeline = None
+    frame_clock = clock
+    if args.threaded:
+        pipeline = make_pipeline(args, game, realtime)
+        frame_clock = pipeline
+        profiler = (make_profiler(args, ("input", "tick", "collide", "draw"), clock),
+                    make_profiler(args, ("render", "flip"), clock))
+    else:
+        profiler = make_profiler(args, ("input", "tick", "collide", "draw", "render", "flip"), clock)
+
+    # Without a window the game runs until the replay ends, or for a minute of game time. Joystick input means a
+    # cabinet, that keeps going.
+    steps = args.frames
+    if steps is None:
+        if "pygame" in sinks or args.joystick is not None:
+            steps = float("inf")
+        else:
+            steps = replay.length() + 1 if replay is not None else clock.rate * 60
+
+    if args.asyncio:
+        # pygame has to stay on the main thread, the window is shown from the loop itself.
+        outputs = [AsyncLoop.Output(make_output(args, kind, layout, led_string_length, clock, window_size), kind,
+                                    inline=kind == "pygame") for kind in sinks]
+        # The recorder goes along with the first output and takes the time of the frames it shows.
+        outputs[0].sink = record(args, outputs[0].sink, led_string_length, outputs[0])
+        queued = Input.QueuedInput(replay)
+        source = record_input(args, queued, clock)
+        with contextlib.ExitStack() as stack:
+            window = None
+            for output in outputs:
+                stack.enter_context(output.sink)
+                # The keyboard is ignored when replaying, the replay goes in through the queue.
+                if output.name == "pygame":
+                    window = Input.PygameInput(output.sink, Input.InputSource() if replay is not None else None)
+            loop = AsyncLoop.AsyncLoop(game, outputs, source, clock, profiler, queued, window)
+            asyncio.run(loop.run(steps, realtime, args.joystick))
+        source.close()
+        report(game, outputs, clock, (profiler,), loop.elapsed)
+    elif sinks[0] == "pygame":
+        sink = make_output(args, "pygame", layout, led_string_length, clock, window_size)
+        sink = record(args, sink, led_string_length, frame_clock)
+        with sink:
+            if pipeline is not None:
+                # The keyboard is ignored when replaying, the replay goes in on the simulation thread.
+                window = Input.PygameInput(sink, Input.InputSource() if replay is not None else None)
+                queued = Input.QueuedInput(replay)
+                run_threaded(game, sink, record_input(args, queued, clock), clock, pipeline, profiler, steps, realtime,
+                             window, queued)
+            else:
+                source = Input.PygameInput(sink, replay)
+                run_pygame(game, sink, record_input(args, source, clock), clock, profiler, args.frames)
+    else:
+        sink = record(args, make_output(args, sinks[0], layout, led_string_length, clock), led_string_length,
+                      frame_clock)
+        source = record_input(args, replay or Input.InputSource(), clock)
+        with sink:
+            if pipeline is not None:
+                run_threaded(game, sink, source, clock, pipeline, profiler, steps, realtime)
+            else:
+                run_headless(game, sink, source, clock, profiler, steps, realtime)
+
+    sys.exit()
+
+
+# Creates the sink of the given kind for the whole string, with a layout mapped onto its outputs. window holds the LED
+# size, margin and status bar height for the pygame window.
+def make_output(args, kind, layout, length, clock, window=None):
+    if kind == "pygame":
+        import PygameSink
+        size, margin, status_height = window
+        # The simulator shows all outputs of a layout one after the other, wrapped into rows.
+        if layout is None:
+            return PygameSink.PygameSink(length, size=size, margin=margin, status_height=status_height)
+        import Layout
+        layout = layout.flatten()
+        sink = PygameSink.PygameSink(layout.output_lengths[0], size=size, margin=margin, status_height=status_height)
+        return Layout.MappedSink(layout, [sink])
+    if layout is None:
+        return make_sink(args, kind, length, 0, clock)
+    import Layout
+    # Mapping works in buffers of the layout, every sink gets a layout of its own so they can be shown concurrently.
+    layout = Layout.Layout(layout.segments, layout.output_lengths)
+    return Layout.MappedSink(layout, [make_sink(args, kind, output_length, output, clock)
+                                      for output, output_length in enumerate(layout.output_lengths)])
+
+
+# Creates the headless sink for one output. With several outputs --host and --device can be comma separated lists, one
+# entry per output.
+def make_sink(args, kind, length, output, clock):
+    if kind == "null":
+        return FrameSink.NullSink()
+    elif kind == "memory":
+        return FrameSink.MemorySink(limit=clock.render_rate)
+    elif kind == "serial":
+        import SerialSink
+        devices = args.device.split(",")
+        return SerialSink.SerialSink(devices[min(output, len(devices) - 1)], length, baudrate=args.baud)
+    else:
+        import NetworkSink
+        hosts = args.host.split(",")
+        sink_class = NetworkSink.DDPSink if kind == "ddp" else NetworkSink.E131Sink
+        port = args.port or (NetworkSink.DDP_PORT if kind == "ddp" else NetworkSink.E131_PORT)
+        return sink_class(hosts[min(output, len(hosts) - 1)], port, fps=clock.render_rate)
+
+
+# Adds a recorder next to the sink if --record was given, it gets the logical frames before any layout mapping.
+def record(args, sink, length, clock):
+    if args.record is None:
+        return sink
+    import Recording
+    return FrameSink.TeeSink([sink, Recording.FrameRecorder(args.record, length, clock)])
+
+
+def make_profiler(args, stages, clock):
+    if not args.profile:
+        return Profiler.NullProfiler()
+    return Profiler.FrameProfiler(stages, budget=1 / clock.render_rate)
 
-    world = {}
-    player = Player.Player(led_string, world)
-    enemy = Enemy.Enemy(led_string, world)
 
-    player_speed = 0
+# The fading screensavers build on the previous frame, the game draws every frame from scratch.
+def make_pipeline(args, game, realtime):
+    import Pipeline
+    policy = args.frame_policy or ("drop" if realtime else "block")
+    return Pipeline.FramePipeline(game.ledstring, buffers=args.buffers, policy=policy, persistent=game.screensaver)
 
-    enemy.spawn(100, -4, 20)
 
-    # pyGame stuff
-    pygame.init()
+def record_input(args, source, clock):
+    if args.record_input is None:
+        return source
+    return Input.InputRecorder(source, args.record_input, clock.rate)
 
-    screen = pygame.display.set_mode((led_size * led_string_length, led_size + led_string_status))
-    clock = pygame.time.Clock()
-    pygame.display.set_caption('pyTWANG')
-    font = pygame.font.Font(None, 20)
 
+def run_pygame(game, sink, source, clock, profiler, frames):
     # main loop
     running = True
-    fps_limit = 60
-    starttime = pygame.time.get_ticks()
-    while running:
-        clock.tick(fps_limit)
-        time = pygame.time.get_ticks()
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_q:
+    time = 0
+    summary = ""
+    summary_time = 0
+    while running and (frames is None or clock.steps < frames):
+        profiler.begin()
+
+        # Advance animations, catching up on all the steps that are due. Input is applied right before the step it
+        # belongs to, that way recordings of it replay exactly.
+        for _ in range(clock.due()):
+            for action in source.poll(clock.steps):
+                if action == "quit":
                     running = False
-                elif event.key == pygame.K_LEFT:
-                    player_speed -= 1
-                elif event.key == pygame.K_RIGHT:
-                    player_speed += 1
-                elif event.key == pygame.K_UP or event.key == pygame.K_DOWN:
-                    player.attack(time)
-            elif event.type == pygame.KEYUP:
-                if event.key == pygame.K_LEFT:
-                    player_speed += 1
-                elif event.key == pygame.K_RIGHT:
-                    player_speed -= 1
-
-        # Clear screen
-        screen.fill((128, 128, 128))
-
-        # Advance animations
-        # led_string.animate()
-        # screensaver.tick(time)
-        led_string.clear()
-        player.speed = player_speed
-        player.tick(time)
-        enemy.tick(time)
-        enemy.collide()
-        player.collide()
-        player.draw(time)
-        enemy.draw()
-
-        # Render LEDs onto the screen
-        led_string.draw(screen)
-
-        # Draw satusbar information
-        status = font.render("t: {} s: {}".format((pygame.time.get_ticks() - starttime) // 1000, player_speed), True, (0, 0, 0))
-        status_rect = status.get_rect()
-        status_rect.topleft = (10, led_size)
-        screen.blit(status, status_rect)
-
-        # Make things visible
-        pygame.display.flip()
-
-    pygame.quit()
-    sys.exit()
+                game.handle(action, clock.time)
+            profiler.lap("input")
+            if not running:
+                break
+            time = clock.advance()
+            game.update(time)
+            profiler.lap("tick")
+            game.collide()
+            profiler.lap("collide")
+
+        # Render the LEDs and the satusbar information
+        if clock.render_due():
+            game.draw(time)
+            profiler.lap("draw")
+            # The profiler summary is only refreshed twice a second, redrawing the status bar every frame would
+            # show up in the numbers.
+            if time - summary_time >= 500:
+                summary = profiler.summary()
+                summary_time = time
+            sink.set_status("t: {} s: {} {}".format(clock.time // 1000, game.player_speed, summary))
+            sink.render(game.ledstring.frame())
+            profiler.lap("render")
+            sink.present()
+            profiler.lap("flip")
+        profiler.end()
+
+        clock.wait()
+    source.close()
+
+
+# Runs the game without any display, with input only from a replay. Normally as fast as the CPU allows, rendering a
+# frame every time one would have been rendered in real time, or in real time for outputs that need it. Reports the
+# achieved simulation rate and a fingerprint of the game state at the end.
+def run_headless(game, sink, source, clock, profiler, steps, realtime=False):
+    render_interval = clock.render_interval()
+    starttime = systime.perf_counter()
+    time = 0
+    running = True
+    while running and clock.steps < steps:
+        profiler.begin()
+        for _ in range(clock.due() if realtime else 1):
+            for action in source.poll(clock.steps):
+                if action == "quit":
+                    running = False
+                game.handle(action, clock.time)
+            profiler.lap("input")
+            if not running:
+                break
+            time = clock.advance()
+            game.update(time)
+            profiler.lap("tick")
+            game.collide()
+            profiler.lap("collide")
+        if running and (clock.render_due() if realtime else (clock.steps - 1) % render_interval == 0):
+            game.draw(time)
+            profiler.lap("draw")
+            sink.show(game.ledstring.frame())
+            profiler.lap("render")
+        profiler.end()
+        if realtime:
+            clock.wait()
+    elapsed = systime.perf_counter() - starttime
+    source.close()
+    report(game, sink, clock, (profiler,), elapsed)
+
+
+# Prints the achieved simulation rate, the profiles and stats of whatever has some and a fingerprint of the game state.
+# sinks is one sink or a list of them, like the outputs of the asyncio loop.
+def report(game, sinks, clock, profilers, elapsed, pipeline=None):
+    print("{} steps ({:.1f}s of game time) in {:.3f}s, {:.1f} steps/s".format(
+        clock.steps, clock.steps / clock.rate, elapsed, clock.steps / elapsed if elapsed else float("inf")))
+    for profiler in profilers:
+        if profiler.summary():
+            print(profiler.summary())
+    if not isinstance(sinks, list):
+        sinks = [sinks]
+    # Sinks that only pass the frames on, like a MappedSink of plain sinks, have nothing to report.
+    for source in sinks + [pipeline]:
+        stats = source.stats() if hasattr(source, "stats") else None
+        if stats:
+            print(" ".join("{}: {}".format(name, value) for name, value in stats.items()))
+    print("state: {}".format(game.digest()))
+
+
+# Runs the simulation on a thread of its own, stepping and deciding which steps get a frame like run_pygame in real time
+# and like run_headless otherwise, while this thread takes the finished frames out of the pipeline and shows them. A
+# slow output only holds up the simulation as far as the frame policy of the pipeline says. pygame has to stay on the
+# main thread, with a window this thread also reads its events and queues them for the simulation.
+def run_threaded(game, sink, source, clock, pipeline, profilers, steps, realtime, window=None, queued=None):
+    simulation_profiler, output_profiler = profilers
+    render_interval = clock.render_interval()
+    errors = []
+
+    def simulate():
+        time = 0
+        running = True
+        try:
+            while running and clock.steps < steps and not pipeline.closed:
+                simulation_profiler.begin()
+                pipeline.begin("simulation")
+                for _ in range(clock.due() if realtime else 1):
+                    for action in source.poll(clock.steps):
+                        if action == "quit":
+                            running = False
+                        game.handle(action, clock.time)
+                    simulation_profiler.lap("input")
+                    if not running:
+                        break
+                    time = clock.advance()
+                    game.update(time)
+                    simulation_profiler.lap("tick")
+                    game.collide()
+                    simulation_profiler.lap("collide")
+                draw = running and (clock.render_due() if realtime else (clock.steps - 1) % render_interval == 0)
+                if draw:
+                    game.draw(time)
+                    simulation_profiler.lap("draw")
+                pipeline.end("simulation")
+                simulation_profiler.end()
+                # Waiting for the output is not simulation work.
+                if draw:
+                    pipeline.publish(time, (clock.time // 1000, game.player_speed))
+                if realtime:
+                    clock.wait()
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            pipeline.close()
+
+    thread = threading.Thread(target=simulate, name="simulation", daemon=True)
+    starttime = systime.perf_counter()
+    thread.start()
+    summary = ""
+    summary_time = 0
+    try:
+        while True:
+            if window is not None:
+                for action in window.poll(None):
+                    queued.put(action)
+            # With a window we have to get back to its events regularly, even when no frame comes.
+            frame = pipeline.acquire(0.01 if window is not None else None)
+            if frame is None:
+                if pipeline.closed:
+                    break
+                continue
+            buffer, time, (seconds, speed) = frame
+            output_profiler.begin()
+            pipeline.begin("output")
+            if window is not None:
+                if time - summary_time >= 500:
+                    summary = " ".join((simulation_profiler.summary(), output_profiler.summary())).strip()
+                    summary_time = time
+                sink.set_status("t: {} s: {} {}".format(seconds, speed, summary))
+                sink.render(buffer)
+                output_profiler.lap("render")
+                sink.present()
+                output_profiler.lap("flip")
+            else:
+                sink.show(buffer)
+                output_profiler.lap("render")
+            pipeline.end("output")
+            output_profiler.end()
+            pipeline.release()
+    finally:
+        pipeline.close()
+        thread.join()
+    elapsed = systime.perf_counter() - starttime
+    source.close()
+    if errors:
+        raise errors[0]
+    report(game, sink, clock, profilers, elapsed, pipeline)
 
 
 # run the main function only if this module is executed as the main script